@@ -0,0 +1,146 @@
+# compare the speed of the python parser generated with '--backend python' against a naive driver, which looks up the
+# tables computed by create_tables() in dictionaries, on random arithmetic expressions of the example grammar
+#
+# run it from anywhere: python3 example/benchmark.py [number of tokens]
+import importlib.util
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from emit_parser import production_to_string
+from grammar import Grammar
+from lr1_collection import augment_grammar, create_collection
+from lr1_tables import create_tables
+from parse_input_file import do_the_magic, parse_arguments, read_input_file
+from process_production import remove_useless_symbols
+
+GRAMMAR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "example.mlg")
+
+# values of the productions of the example grammar
+ACTIONS = {
+    "e -> e PLUS t": lambda a, op, b: a + b,
+    "e -> e SUB t": lambda a, op, b: a - b,
+    "t -> t MULT f": lambda a, op, b: a * b,
+    "t -> t DIV f": lambda a, op, b: int(a / b) if b != 0 else 0,
+    "f -> OPAR e CPAR": lambda opar, e, cpar: e,
+    "f -> NUM": int,
+}
+
+
+# generate the python parser into a temporary directory and import it
+def load_generated_parser(directory):
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        options = parse_arguments(["--backend", "python", GRAMMAR])
+        do_the_magic(*read_input_file(GRAMMAR), options)
+    finally:
+        os.chdir(cwd)
+
+    spec = importlib.util.spec_from_file_location("my_little_parser", os.path.join(directory, "my_little_parser.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# a straightforward parser over the tables as create_tables() returns them, with dictionaries for the lookups
+class NaiveParser:
+    def __init__(self, actions):
+        (manifest_code, types, terminals, nonterminals, terminals_list) = read_input_file(GRAMMAR)
+        remove_useless_symbols(nonterminals)
+        augment_grammar(nonterminals)
+        grammar = Grammar(terminals, nonterminals, terminals_list)
+        (collection, transitions) = create_collection(grammar)
+        (action_table, goto_table, productions) = create_tables(collection, transitions, grammar)
+
+        self.terminals = action_table[0]
+        self.action = dict()
+        self.goto = dict()
+        for state in range(len(action_table) - 1):
+            for sym in range(len(action_table[0])):
+                if action_table[state + 1][sym] is not None:
+                    self.action[(state, action_table[0][sym])] = action_table[state + 1][sym]
+            for sym in range(len(goto_table[0])):
+                if goto_table[state + 1][sym] is not None:
+                    self.goto[(state, goto_table[0][sym])] = goto_table[state + 1][sym]
+        self.productions = [(head.name, 0 if body[0].name == "eps" else len(body),
+                             actions.get(production_to_string((head, body))))
+                            for (head, body) in productions]
+
+    def parse(self, tokens):
+        stack = [(0, None)]
+        tokens = list(tokens) + [(len(self.terminals) - 1, None)]
+        i = 0
+        while True:
+            (token_type, lexeme) = tokens[i]
+            action = self.action.get((stack[-1][0], self.terminals[token_type]))
+            if action is None:
+                raise SyntaxError("unexpected token at position " + str(i))
+            elif action == 'a':
+                return stack[-1][1]
+            elif action[0] == 's':
+                stack.append((action[1], lexeme))
+                i += 1
+            else:
+                (head, length, function) = self.productions[action[1]]
+                values = [value for (state, value) in stack[len(stack) - length:]]
+                del stack[len(stack) - length:]
+                if function is not None:
+                    value = function(*values)
+                else:
+                    value = values[0] if length > 0 else None
+                stack.append((self.goto[(stack[-1][0], head)], value))
+
+
+# random expression of the example grammar, as a list of (token type, lexeme) pairs
+def random_expression(token_types, num_tokens, rng):
+    tokens = []
+    depth = 0
+    while True:
+        # an operand, which may open some parentheses first
+        while rng.random() < 0.2 and len(tokens) < num_tokens:
+            tokens.append((token_types["OPAR"], "("))
+            depth += 1
+        tokens.append((token_types["NUM"], str(rng.randint(1, 99))))
+        while depth > 0 and rng.random() < 0.3:
+            tokens.append((token_types["CPAR"], ")"))
+            depth -= 1
+
+        # an operator is only added if another operand follows it
+        if len(tokens) >= num_tokens and depth == 0:
+            return tokens
+        name = rng.choice(["PLUS", "SUB", "MULT", "DIV"])
+        tokens.append((token_types[name], name))
+
+
+# parse the tokens a few times and return the best number of tokens per second, and the value of the expression
+def measure(parser, tokens, repeat=5):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        value = parser.parse(tokens)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return len(tokens) / best, value
+
+
+if __name__ == "__main__":
+    num_tokens = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as directory:
+        generated = load_generated_parser(directory)
+    tokens = random_expression(generated.TOKEN_TYPES, num_tokens, random.Random(1))
+
+    (naive_speed, naive_value) = measure(NaiveParser(ACTIONS), tokens)
+    (generated_speed, generated_value) = measure(generated.Parser(ACTIONS), tokens)
+    if naive_value != generated_value:
+        print("The parsers do not agree: " + str(naive_value) + " and " + str(generated_value))
+        sys.exit(1)
+
+    print("Tokens: " + str(len(tokens)))
+    print("Naive dictionary driver: {:,.0f} tokens/s".format(naive_speed))
+    print("Generated parser:        {:,.0f} tokens/s ({:.1f}x)".format(generated_speed, generated_speed / naive_speed))
@@ -5,44 +5,77 @@
 #
 # [1] The Dragon Book, 2nd Ed, p. 251
 
+import hashlib
+import io
+import os
+
+from table_formats import CompressedTables, integer_type
+
 
 # open the header file and emit necessary class and enum declarations (eg. GrammarSymbol class, ParserStates enum, etc.)
 # also emit manifest code, which is provided by the user in the first part of the input file
-def create_header_and_emit_manifest(manifest, types, collection, goto_table, action_table, productions):
-    with open("my_little_parser.h", 'w') as header:
+# tables are either table_formats.DenseTables or table_formats.CompressedTables, or None for the direct-coded parser
+# if lexeme_views is set, terminals hold non-owning views of their lexemes, which are kept in an arena
+# if incremental is set, the parser keeps the tree of its last parse, so it can reparse an edited input
+# if parse_many is set, a driver which parses many files on a pool of threads is emitted as well
+# if syntax_tree is set, the parser builds the concrete syntax tree of every parse
+# if stats is set, the parser counts what it does (otherwise, the generated code does not change at all)
+#
+# the generated parser is reentrant: the tables are constant arrays, and all of the state of a parse lives in the
+# Parser object, so any number of parsers can run on different threads at the same time
+def create_header_and_emit_manifest(manifest, types, goto_table, action_table, productions, tables,
+                                    lexeme_views=False, incremental=False, parse_many=False, syntax_tree=False,
+                                    stats=False):
+    num_states = len(action_table) - 1
+    with io.StringIO() as header:
         # emit header guards and includes
         header.writelines([
             "#ifndef __MY_LITTLE_PARSER_H\n"
             "#define __MY_LITTLE_PARSER_H\n\n"
-            "#include <stack>\n"
+            "#include <vector>\n"
             "#include <cstring>\n"
             "#include <fstream>\n"
             "#include <list>\n"
-            "#include <memory>\n\n"
-            "#include \"my_little_lexer.h\"\n\n"
+            "#include <memory>\n"
         ])
+        if parse_many:
+            header.write("#include <functional>\n")
+        if stats:
+            header.write("#include <ostream>\n")
+        header.write("\n#include \"my_little_lexer.h\"\n\n")
 
         # emit manifest code
         header.writelines(manifest)
         header.write("\n\n")
 
+        emit_token_spans(len(action_table[0]) - 1, header)
+        if lexeme_views:
+            emit_lexeme_arena(header)
+
         # emit types union
         header.write("union types {\n")
         # write the terminals lexeme field
-        header.write("\tchar* lexeme;\n")
+        header.write("\tLexemeView lexeme;\n" if lexeme_views else "\tchar* lexeme;\n")
         i = 0
         for type in types:
             header.write("\t" + type + " __" + str(i) + ";\n")
             i += 1
         header.write("};\n\n")
 
+        if incremental:
+            emit_parse_node(num_states, header)
+        if syntax_tree:
+            emit_syntax_node(action_table, goto_table, productions, header)
+        if stats:
+            emit_parser_stats(num_states, productions, header)
+
         # emit an enum representing LR(0) automaton states
         header.writelines([
             "// States of the LR(0) automaton\n"
-            "enum class ParserStates : uint16_t {\n"
+            "enum class ParserStates : " + integer_type(0, num_states) + " {\n"
             "\tS0 = 0,\n"
         ])
-        for i in range(1, len(collection)):
+        for i in range(1, num_states):
             header.write("\tS" + str(i) + ",\n")
         header.writelines([
             "\tSE\n"
@@ -52,40 +85,118 @@ def create_header_and_emit_manifest(manifest, types, collection, goto_table, act
         # emit an enum representing nonterminal symbols
         header.writelines([
             "// Enumeration of used nonterminal symbols.\n"
-            "enum class Nonterminals : uint8_t {\n"
+            "enum class Nonterminals : " + integer_type(0, len(goto_table[0]) - 1) + " {\n"
         ])
         header.write("\t" + goto_table[0][0] + " = 0,\n")
         for nonterminal in goto_table[0][1:len(goto_table[0])]:
             header.write("\t" + nonterminal + ",\n")
         header.write("};\n\n")
 
-        # emit the Parser class
+        # emit the results of pushing a token, and the Parser class
+        header.writelines([
+            "// Result of pushing a token to the parser: it either needs more tokens,\n"
+            "// or the parse is over, successfully or not.\n"
+            "enum class PushResult {\n"
+            "\tNEED_MORE,\n"
+            "\tACCEPT,\n"
+            "\tERROR\n"
+            "};\n\n"
+        ])
         header.writelines([
             "// Take a stream of tokens from the lexer and check for syntactic correctness\n"
             "// while building a parse tree.\n"
             "class Parser {\n"
-            "\t// Stack of LR(0) automaton states.\n"
-            "\tstd::stack<ParserStates> states_stack;\n"
-            "\t// Current input token.\n"
-            "\tstd::shared_ptr<Token> current_input;\n"
+            "\t// Stack of LR(0) automaton states. Both stacks keep their capacity\n"
+            "\t// between the calls to parse().\n"
+            "\tstd::vector<ParserStates> states_stack;\n"
             "\t// A stack of nonterminal values, used in the user defined code.\n"
-            "\tstd::stack<union types> sym_stack;\n"
-            "\t// Lexer which is used for providing the tokens.\n"
-            "\tLexer& lexer;\n\n"
-            "\tusing ActionTableEntry = std::pair<char, uint8_t>;\n"
-            "\tusing FunctionType = void (*)(std::stack<union types>&);\n"
-            "\tusing Production = std::tuple<Nonterminals, int, FunctionType>;\n\n"
-            "\t// ACTION table.\n"
-            "\tstatic ActionTableEntry action_table[" + str(len(collection)) + "][" + str(len(action_table[0])) + "];\n"
-            "\t// GOTO table.\n"
-            "\tstatic ParserStates goto_table[" + str(len(collection)) + "][" + str(len(goto_table[0])) + "];\n"
-            "\t// Table of productions.\n"
-            "\tstatic Production productions[" + str(len(productions)) + "];\n"
+            "\tstd::vector<union types> sym_stack;\n"
+            "\t// Lexer which is used for providing the tokens, if there is one.\n"
+            "\tLexer* lexer;\n\n"
+        ])
+        if lexeme_views:
+            header.write("\t// Lexemes of the current parse.\n"
+                         "\tLexemeArena lexemes;\n\n")
+        if incremental:
+            header.writelines([
+                "\t// Tree of the last parse: its nodes, the children of every node, the nodes\n"
+                "\t// of the symbols on the stack and the root, once the parse is accepted.\n"
+                "\tstd::vector<ParseNode> nodes;\n"
+                "\tstd::vector<uint32_t> children;\n"
+                "\tstd::vector<uint32_t> node_stack;\n"
+                "\tuint32_t root{ParseNode::no_node};\n"
+                "\t// Number of nodes right after the last full parse or compaction, all of\n"
+                "\t// which were in the tree.\n"
+                "\tstd::size_t live_nodes{0};\n\n"
+                "\t// Add the node of a shifted token, or of the head of a reduced production\n"
+                "\t// which was begun in the given state, to the tree.\n"
+                "\tvoid add_token_node();\n"
+                "\tvoid add_node(int production, int state);\n"
+                "\t// Move the tree into new arrays, dropping the nodes which are not in it.\n"
+                "\tvoid compact_tree();\n"
+            ])
+        if syntax_tree:
+            header.writelines([
+                "\t// Concrete syntax tree of the last parse, the nodes of the symbols on the\n"
+                "\t// stack, which are moved into the tree once they get their parent, and the\n"
+                "\t// number of tokens shifted so far.\n"
+                "\tstd::vector<SyntaxNode> syntax_tree;\n"
+                "\tstd::vector<SyntaxNode> syntax_stack;\n"
+                "\tuint32_t num_tokens{0};\n\n"
+                "\t// Make the node of a reduced production the parent of the nodes of its body.\n"
+                "\tvoid add_syntax_node(int kind, int production, std::size_t length);\n"
+            ])
+        if stats:
+            header.writelines([
+                "\t// Counters of the parses since the parser was made, or since the last\n"
+                "\t// call to reset_stats().\n"
+                "\tParserStats stats;\n\n"
+                "\tvoid count_visit(int state) {\n"
+                "\t\tthis->stats.state_visits[state]++;\n"
+                "\t\tif (this->states_stack.size() > this->stats.max_states_depth)\n"
+                "\t\t\tthis->stats.max_states_depth = this->states_stack.size();\n"
+                "\t\tif (this->sym_stack.size() > this->stats.max_symbols_depth)\n"
+                "\t\t\tthis->stats.max_symbols_depth = this->sym_stack.size();\n"
+                "\t}\n"
+                "\tvoid count_shift() { this->stats.shifts++; }\n"
+                "\tvoid count_reduction(int production) {\n"
+                "\t\tthis->stats.reductions++;\n"
+                "\t\tthis->stats.production_reductions[production]++;\n"
+                "\t}\n"
+            ])
+
+        if tables is None:
+            header.writelines([
+                "\t// Push the lexeme of the current input token to the symbol stack, and\n"
+                "\t// consume the token.\n"
+                "\ttemplate <typename Input>\n"
+                "\tvoid shift_token(Input& input);\n"
+            ])
+        else:
+            emit_table_declarations(action_table, goto_table, productions, tables, header)
+            header.writelines([
+                "\t// Run the user defined code of the production on the symbol stack.\n"
+                "\tvoid reduce(int production);\n"
+            ])
+
+        header.writelines([
+            "\t// The parsing algorithm, which continues from the states on the stack and\n"
+            "\t// takes the tokens from the input, until it runs out of them or the parse\n"
+            "\t// is over.\n"
+            "\ttemplate <typename Input>\n"
+            "\tPushResult resume(Input& input);\n"
             "public:\n"
-            "\tParser() = delete;\n"
+            "\t// Parser without a lexer, which only parses already tokenized inputs.\n"
+            "\tParser() : lexer(nullptr) {\n"
+            "\t\tthis->states_stack.reserve(256);\n"
+            "\t\tthis->sym_stack.reserve(256);\n"
+            "\t}\n"
             "\tParser(const Parser&) = delete;\n"
             "\tParser(Parser&&) = delete;\n"
-            "\tParser(Lexer& lexer) : lexer(lexer) {}\n"
+            "\tParser(Lexer& lexer) : lexer(&lexer) {\n"
+            "\t\tthis->states_stack.reserve(256);\n"
+            "\t\tthis->sym_stack.reserve(256);\n"
+            "\t}\n"
             "\t~Parser() = default;\n"
             "\tParser& operator=(Parser&) = delete;\n"
             "\tParser& operator=(Parser&&) = delete;\n"
@@ -93,195 +204,1207 @@ def create_header_and_emit_manifest(manifest, types, collection, goto_table, act
             "\t// heart of the parser. This method implements LR(1) parsing algorithm\n"
             "\t// described in the 'Dragon Book' (2nd edition, p. 241).\n"
             "\tbool parse();\n"
+            "\t// Parse the input of the given lexer, which is used from then on.\n"
+            "\tbool parse(Lexer& lexer);\n"
+            "\t// Parse an already tokenized input. Lexemes of the tokens are found in the\n"
+            "\t// text at their offsets, and the tokens past the end of the array are\n"
+            "\t// taken to be the end of input.\n"
+            "\tbool parse(const TokenSpan* tokens, std::size_t count, const char* text);\n"
+            "\t// Parse the tokens of the source, one batch after another.\n"
+            "\tbool parse(TokenSource& source);\n"
+            "\t// Begin a parse whose tokens are pushed one by one. The parser keeps all\n"
+            "\t// of its state between the pushes, so any number of parsers can be fed\n"
+            "\t// from a single thread as their input arrives.\n"
+            "\tvoid start();\n"
+            "\t// Push the next token. The lexeme is copied if the token is shifted. The\n"
+            "\t// parser needs more tokens until the end of input token is pushed. Once\n"
+            "\t// the parse is over, pushing returns ERROR until the next start().\n"
+            "\tPushResult push(TokenType token_type, const char* lexeme, std::size_t length);\n"
+            "\tPushResult push(const Token& token) {\n"
+            "\t\treturn this->push(token.get_token_type(), token.get_lexeme().c_str(), token.get_lexeme().size());\n"
+            "\t}\n"
+        ])
+        if incremental:
+            header.writelines([
+                "\t// Parse an edited input, where the tokens [edit_begin, edit_end) of the last\n"
+                "\t// input were replaced by the given number of inserted tokens. Subtrees of\n"
+                "\t// the last parse which the edit did not touch are reused as they are, along\n"
+                "\t// with their values, so only the tokens around the edit are parsed again.\n"
+                "\tbool reparse(const TokenSpan* tokens, std::size_t count, const char* text,\n"
+                "\t             std::size_t edit_begin, std::size_t edit_end, std::size_t inserted);\n"
+            ])
+        if syntax_tree:
+            header.writelines([
+                "\t// Return the concrete syntax tree of the last successful parse. Its root is\n"
+                "\t// the last node.\n"
+                "\tconst std::vector<SyntaxNode>& get_syntax_tree() const { return this->syntax_tree; }\n"
+                "\t// Free the memory of the tree at once. The next parse allocates it again.\n"
+                "\tvoid release_syntax_tree() {\n"
+                "\t\tstd::vector<SyntaxNode>().swap(this->syntax_tree);\n"
+                "\t\tstd::vector<SyntaxNode>().swap(this->syntax_stack);\n"
+                "\t}\n"
+            ])
+        if stats:
+            header.writelines([
+                "\t// Return the counters of the parses.\n"
+                "\tconst ParserStats& get_stats() const { return this->stats; }\n"
+                "\tvoid reset_stats() { this->stats = ParserStats(); }\n"
+                "\t// Write the counters as a JSON object.\n"
+                "\tvoid dump_stats(std::ostream& os) const;\n"
+            ])
+        header.writelines([
             "\t// Return the value of the start symbol. Should be called after the successful call to parse();\n"
-            "\tunion types get_top_value() { return this->sym_stack.top(); }\n"
+            "\tunion types get_top_value() { return this->sym_stack.back(); }\n"
             "};\n\n"
         ])
 
+        if parse_many:
+            header.writelines([
+                "// Result of parsing one file with parse_many().\n"
+                "struct ParseResult {\n"
+                "\tbool accepted{false};\n"
+                "\t// Value of the start symbol, if the file was accepted.\n"
+                "\tunion types value{};\n"
+                "\t// What went wrong, if the file was not accepted.\n"
+                "\tstd::string error;\n"
+                "};\n\n"
+                "// Opens the token source of one input for parse_many(). It is called on the\n"
+                "// worker threads, and the sources it makes are used on different threads at\n"
+                "// once, so they must not share any state. It may throw, or return nullptr if\n"
+                "// the input can not be opened.\n"
+                "using SourceFactory = std::function<std::unique_ptr<TokenSource>(const std::string&)>;\n\n"
+                "// Parse the inputs on the given number of threads, and return the results in\n"
+                "// the order of the inputs. Every thread takes the next input as soon as it is\n"
+                "// done with the previous one, reusing its parser and the stacks of the parser.\n"
+                "std::vector<ParseResult> parse_many(const std::vector<std::string>& inputs, unsigned n_threads,\n"
+                "                                    const SourceFactory& open_source);\n"
+                "// Parse the files with the lexer. Lexers made by my lexer generator share a\n"
+                "// static line counter, so only one of them runs at a time, while the parsing\n"
+                "// itself runs on all the threads.\n"
+                "std::vector<ParseResult> parse_many(const std::vector<std::string>& paths, unsigned n_threads);\n\n"
+            ])
+
         header.write("#endif // __MY_LITTLE_PARSER_H")
 
+        write_file("my_little_parser.h", header.getvalue())
 
-# emit user defined code
-def emit_code(productions, body):
-    i = 0
-    head = productions[0][0]
-    # for each production of a nonterminal, extract the code from the nonterminal object
-    for production in productions:
-        if production[0] != head:
-            head = production[0]
-            i = 0
-        code = head.code[i]
 
-        # if this is a nontrivial (or empty) production and there is no user provided code, let it be
-        if (code == '' and len(production[1]) > 1) or production[1][0].name == "eps":
-            i += 1
-            continue
+# emit the token spans, which describe already tokenized inputs, the source which provides them in batches, and its
+# adapter over lexers
+def emit_token_spans(end, header):
+    header.writelines([
+        "// One token of an already tokenized input: its type, and the offset and\n"
+        "// length of its lexeme in the text of the input.\n"
+        "struct TokenSpan {\n"
+        "\tTokenType token_type;\n"
+        "\tuint32_t offset;\n"
+        "\tuint32_t length;\n"
+        "};\n\n"
+        "// Source of token spans, which provides them one batch at a time.\n"
+        "class TokenSource {\n"
+        "public:\n"
+        "\tenum : int { end_of_input = " + str(end) + " };\n"
+        "\t// Tokens of the current batch, and the text which holds their lexemes.\n"
+        "\tstd::vector<TokenSpan> tokens;\n"
+        "\tstd::string text;\n\n"
+        "\tvirtual ~TokenSource() = default;\n"
+        "\t// Replace the current batch with the next one. Return false if there are\n"
+        "\t// no more tokens.\n"
+        "\tvirtual bool fill() = 0;\n"
+        "};\n\n"
+        "// Adapter which pulls the tokens from a lexer in batches of the given size.\n"
+        "// The lexer only needs a get_next_word() method, which returns a pointer to\n"
+        "// a token. The last batch ends with the end of input token.\n"
+        "template <typename L>\n"
+        "class TokenBatcher : public TokenSource {\n"
+        "\tL& lexer;\n"
+        "\tstd::size_t batch_size;\n"
+        "\tbool at_end{false};\n"
+        "public:\n"
+        "\tTokenBatcher(L& lexer, std::size_t batch_size = 1024) : lexer(lexer), batch_size(batch_size) {\n"
+        "\t\tthis->tokens.reserve(batch_size);\n"
+        "\t}\n\n"
+        "\tbool fill() override {\n"
+        "\t\tthis->tokens.clear();\n"
+        "\t\tthis->text.clear();\n"
+        "\t\twhile (!this->at_end && this->tokens.size() < this->batch_size) {\n"
+        "\t\t\tauto token = this->lexer.get_next_word();\n"
+        "\t\t\tconst std::string& lexeme{token->get_lexeme()};\n"
+        "\t\t\tthis->tokens.push_back(TokenSpan{token->get_token_type(), static_cast<uint32_t>(this->text.size()),\n"
+        "\t\t\t                                 static_cast<uint32_t>(lexeme.size())});\n"
+        "\t\t\tthis->text += lexeme;\n"
+        "\t\t\tthis->at_end = static_cast<int>(token->get_token_type()) == end_of_input;\n"
+        "\t\t}\n"
+        "\t\treturn !this->tokens.empty();\n"
+        "\t}\n"
+        "};\n\n"
+    ])
 
-        body.writelines([
-            "void " + head.name + "__" + str(i) + "(std::stack<union types>& sym_stack) {\n"
-                                                  "\tunion types param__head;\n"
+
+# emit the node of the tree which the incremental parser keeps
+def emit_parse_node(num_states, header):
+    header.writelines([
+        "// Node of the tree of the last parse. Positions of the nodes are not kept,\n"
+        "// only their widths, so the subtrees which follow an edit can be reused as\n"
+        "// they are.\n"
+        "struct ParseNode {\n"
+        "\tenum : uint32_t { no_node = 0xffffffff };\n"
+        "\t// State in which the parse of the node was begun.\n"
+        "\t" + integer_type(0, num_states) + " state;\n"
+        "\t// GOTO table column of the nonterminal, or -1 for a token.\n"
+        "\tint symbol;\n"
+        "\t// Number of tokens the node spans.\n"
+        "\tuint32_t width;\n"
+        "\tuint32_t first_child;\n"
+        "\tuint32_t num_children;\n"
+        "\tunion types value;\n"
+        "};\n\n"
+    ])
+
+
+# emit the node of the concrete syntax tree
+def emit_syntax_node(action_table, goto_table, productions, header):
+    num_terminals = len(action_table[0])
+    header.writelines([
+        "// Node of the concrete syntax tree. The tree is a flat array of nodes, where\n"
+        "// the children of every node are next to each other, so it is allocated and\n"
+        "// freed at once and it is cheap to walk through.\n"
+        "struct SyntaxNode {\n"
+        "\t// Kinds of the nodes of nonterminals start after the token types.\n"
+        "\tenum : int { first_nonterminal = " + str(num_terminals) + " };\n"
+        "\t// Token type, or first_nonterminal plus the nonterminal.\n"
+        "\t" + integer_type(0, num_terminals + len(goto_table[0])) + " kind;\n"
+        "\t// Reduced production, or -1 for a token.\n"
+        "\t" + integer_type(-1, len(productions)) + " production;\n"
+        "\tuint32_t first_child;\n"
+        "\tuint32_t num_children;\n"
+        "\t// Tokens which the node spans, numbered from the beginning of the input.\n"
+        "\tuint32_t first_token;\n"
+        "\tuint32_t num_tokens;\n"
+        "};\n\n"
+    ])
+
+
+# emit the counters of the instrumented parser
+def emit_parser_stats(num_states, productions, header):
+    header.writelines([
+        "// Counters of the parses.\n"
+        "struct ParserStats {\n"
+        "\tuint64_t shifts{0};\n"
+        "\tuint64_t reductions{0};\n"
+        "\t// Number of reductions by every production.\n"
+        "\tuint64_t production_reductions[" + str(len(productions)) + "]{};\n"
+        "\t// Number of times the parser acted in every state.\n"
+        "\tuint64_t state_visits[" + str(num_states) + "]{};\n"
+        "\t// Deepest the stacks have been.\n"
+        "\tstd::size_t max_states_depth{0};\n"
+        "\tstd::size_t max_symbols_depth{0};\n"
+        "\t// Clock ticks spent in the user defined code of every production. These are\n"
+        "\t// only measured if MY_LITTLE_PARSER_TIME_ACTIONS is defined.\n"
+        "\tuint64_t action_ticks[" + str(len(productions)) + "]{};\n"
+        "};\n\n"
+    ])
+
+
+# emit the lexeme view and the arena which holds the lexemes
+def emit_lexeme_arena(header):
+    header.writelines([
+        "// Non-owning view of a lexeme. The text is NUL-terminated, and it stays\n"
+        "// valid until the parser which produced it starts the next parse.\n"
+        "struct LexemeView {\n"
+        "\tconst char* text;\n"
+        "\tstd::size_t length;\n"
+        "\toperator const char*() const { return this->text; }\n"
+        "};\n\n"
+        "// Storage for the lexemes of one parse. Lexemes are copied into big blocks,\n"
+        "// which are all reused at once when the next parse begins, so there is no\n"
+        "// memory allocation per token.\n"
+        "class LexemeArena {\n"
+        "\tenum : std::size_t { block_size = 65536 };\n"
+        "\t// Blocks of memory and their sizes.\n"
+        "\tstd::vector<std::pair<std::unique_ptr<char[]>, std::size_t>> blocks;\n"
+        "\t// Block which is being filled, and the number of bytes used in it.\n"
+        "\tstd::size_t current{0};\n"
+        "\tstd::size_t used{0};\n"
+        "public:\n"
+        "\tLexemeView store(const char* lexeme, std::size_t length) {\n"
+        "\t\tstd::size_t size{length + 1};\n"
+        "\t\twhile (this->current < this->blocks.size() && this->used + size > this->blocks[this->current].second) {\n"
+        "\t\t\tthis->current++;\n"
+        "\t\t\tthis->used = 0;\n"
+        "\t\t}\n"
+        "\t\tif (this->current == this->blocks.size()) {\n"
+        "\t\t\tstd::size_t block{size > block_size ? size : static_cast<std::size_t>(block_size)};\n"
+        "\t\t\tthis->blocks.emplace_back(std::unique_ptr<char[]>(new char[block]), block);\n"
+        "\t\t}\n"
+        "\t\tchar* text{this->blocks[this->current].first.get() + this->used};\n"
+        "\t\tmemcpy(text, lexeme, length);\n"
+        "\t\ttext[length] = '\\0';\n"
+        "\t\tthis->used += size;\n"
+        "\t\treturn LexemeView{text, length};\n"
+        "\t}\n"
+        "\t// Drop all of the lexemes, keeping the memory.\n"
+        "\tvoid clear() {\n"
+        "\t\tthis->current = 0;\n"
+        "\t\tthis->used = 0;\n"
+        "\t}\n"
+        "};\n\n"
+    ])
+
+
+# declare the tables, the functions which look them up, and the tables of productions
+def emit_table_declarations(action_table, goto_table, productions, tables, header):
+    header.writelines([
+        "\t// Actions are encoded as integers: n > 0 shifts to state n, -p - 1 reduces\n"
+        "\t// by production p and 0 is an error. Reducing by the production of the\n"
+        "\t// augmented starting symbol accepts.\n"
+        "\tenum : int {\n"
+    ])
+    if isinstance(tables, CompressedTables):
+        header.writelines([
+            "\t\tno_action_base = " + str(tables.no_action_base) + ",\n"
+            "\t\ttable_size = " + str(len(tables.table)) + ",\n"
         ])
+    header.writelines([
+        "\t\taccept_action = " + str(tables.accept) + "\n"
+        "\t};\n\n"
+    ])
 
-        # prepare the parameters
-        param_num = len(production[1]) - 1
-        for sym in production[1]:
-            body.writelines([
-                "\tunion types param__" + str(param_num) + "{sym_stack.top()};\n"
-                                                           "\tsym_stack.pop();\n"
-            ])
-            param_num -= 1
-        body.write("\n")
-
-        # replace the placeholder parameters with the real ones
-        code = code.replace("$$", "param__head.__" + str(head.type))
-        for j in range(len(production[1])):
-            param = "param__" + str(j) + '.'
-            sym = production[1][j]
-            if sym.is_terminal:
-                param += "lexeme"
-            else:
-                param += "__" + str(sym.type)
+    if isinstance(tables, CompressedTables):
+        emit_compressed_declarations(goto_table, tables, header)
+    else:
+        emit_dense_declarations(action_table, goto_table, tables, header)
+
+    (heads, lengths, production_type) = production_arrays(goto_table, productions)
+    header.writelines([
+        "\t// Head and body length of every production.\n"
+        "\tstatic const " + production_type + " production_heads[" + str(len(productions)) + "];\n"
+        "\tstatic const " + production_type + " production_lengths[" + str(len(productions)) + "];\n"
+    ])
+
+
+# declare the dense tables, along with the functions which look them up
+def emit_dense_declarations(action_table, goto_table, tables, header):
+    num_states = len(action_table) - 1
+    header.writelines([
+        "\t// ACTION table.\n"
+        "\tstatic const " + tables.action_type + " action_table[" + str(num_states) + "]["
+        + str(len(action_table[0])) + "];\n"
+        "\t// Default actions of the consistent states. These states reduce without\n"
+        "\t// looking at (or even fetching) the next input token.\n"
+        "\tstatic const " + tables.default_action_type + " default_actions[" + str(num_states) + "];\n"
+        "\t// GOTO table.\n"
+        "\tstatic const " + tables.state_type + " goto_table[" + str(num_states) + "]["
+        + str(len(goto_table[0])) + "];\n\n"
+        "\tstatic bool reduces_by_default(int state) { return default_actions[state] != 0; }\n"
+        "\tstatic int lookup_action(int state, int token_type) { return action_table[state][token_type]; }\n"
+        "\tstatic int lookup_goto(int state, int nonterminal) { return goto_table[state][nonterminal]; }\n\n"
+    ])
+
+
+# declare the compressed tables, along with the functions which look them up
+def emit_compressed_declarations(goto_table, tables, header):
+    num_states = len(tables.action_base)
+    num_nonterminals = len(goto_table[0])
+    header.writelines([
+        "\t// Compressed ACTION and GOTO tables. Entries of the ACTION row of a state,\n"
+        "\t// and of the GOTO column of a nonterminal, are placed in the shared table\n"
+        "\t// from their base offset on. The check array tells whether a slot of the\n"
+        "\t// table belongs to the row (column) at hand, otherwise the default is used.\n"
+        "\tstatic const " + tables.action_base_type + " action_base[" + str(num_states) + "];\n"
+        "\t// Default reductions, encoded as p + 1, or 0 for an error. States without an\n"
+        "\t// ACTION row reduce by them without looking at (or even fetching) the next\n"
+        "\t// input token.\n"
+        "\tstatic const " + tables.default_action_type + " default_actions[" + str(num_states) + "];\n"
+        "\tstatic const " + tables.goto_base_type + " goto_base[" + str(num_nonterminals) + "];\n"
+        "\tstatic const " + tables.default_goto_type + " default_gotos[" + str(num_nonterminals) + "];\n"
+        "\tstatic const " + tables.action_type + " table[" + str(len(tables.table)) + "];\n"
+        "\tstatic const " + tables.check_type + " check[" + str(len(tables.check)) + "];\n\n"
+        "\tstatic bool reduces_by_default(int state) { return action_base[state] == no_action_base; }\n"
+        "\tstatic int lookup_action(int state, int token_type) {\n"
+        "\t\tint index{action_base[state] + token_type};\n"
+        "\t\tif (index >= 0 && index < table_size && static_cast<int>(check[index]) == token_type)\n"
+        "\t\t\treturn table[index];\n"
+        "\t\treturn -static_cast<int>(default_actions[state]);\n"
+        "\t}\n"
+        "\tstatic int lookup_goto(int state, int nonterminal) {\n"
+        "\t\tint index{goto_base[nonterminal] + state};\n"
+        "\t\tif (index >= 0 && index < table_size && static_cast<int>(check[index]) == state)\n"
+        "\t\t\treturn table[index];\n"
+        "\t\treturn default_gotos[nonterminal];\n"
+        "\t}\n\n"
+    ])
+
+
+# generate the code which runs on every reduction, one list of lines for each production
+# the code works on the symbol stack in place: $0, $1, ... are the values of the body symbols, found at their offsets
+# from the top of the stack, and $$ is written into the slot of $0, which becomes the value of the head
+# lexemes of the terminals are freed after the user defined code is done with them, unless they are views into the arena
+# productions without user defined code keep the value of their first body symbol (empty productions push a new value)
+def reduction_code(productions, lexeme_views=False):
+    reductions = []
+    for production in productions:
+        head = production[0]
+        # productions can be renumbered, so the code is found by the body of the production
+        code = next(head.code[i] for i in range(len(head.productions)) if head.productions[i] is production[1])
+
+        lines = []
+        body = production[1]
+        if body[0].name == "eps":
+            lines.append("this->sym_stack.emplace_back();")
+            if code != '':
+                lines.append("union types* values{&this->sym_stack.back()};")
+                lines.append(code.replace("$$", "values[0].__" + str(head.type)))
+            reductions.append(lines)
+            continue
 
-            code = code.replace('$' + str(j), param)
+        # if this is a nontrivial production and there is no user provided code, its terminals are still freed
+        lexemes = [j for j in range(len(body)) if body[j].is_terminal and (code != '' or j > 0 or len(body) == 1)]
+        if lexeme_views:
+            lexemes = []
+        if len(lexemes) > 0 or code != '':
+            lines.append("union types* values{&this->sym_stack[this->sym_stack.size() - " + str(len(body)) + "]};")
+        for j in lexemes:
+            lines.append("char* lexeme__" + str(j) + "{values[" + str(j) + "].lexeme};")
 
-        # write the code itself
+        # replace the placeholders with the values on the stack ($10 before $1)
         if code != '':
-            code = "\t" + code + "\n\n"
-            body.write(code)
-        # if this is a trivial production and there is no user provided code, emit the default expression
-        else:
-            body.write("\tparam__head = param__0;\n\n")
+            code = code.replace("$$", "values[0].__" + str(head.type))
+            for j in reversed(range(len(body))):
+                param = "values[" + str(j) + "]."
+                if body[j].is_terminal:
+                    param += "lexeme"
+                else:
+                    param += "__" + str(body[j].type)
 
-        # free the memory which holds the lexeme of popped terminals
-        param_num = len(production[1]) - 1
-        for sym in production[1]:
-            if sym.is_terminal:
-                body.write("\tdelete[](param__" + str(param_num) + ".lexeme);\n")
-            param_num -= 1
-        body.write("\n")
+                code = code.replace('$' + str(j), param)
+            lines.append(code)
 
-        # push the result onto the stack
-        body.writelines([
-            "\tsym_stack.push(param__head);\n"
-            "}\n\n"
-        ])
+        # free the memory which holds the lexemes of the terminals, and pop the body values but the first one
+        for j in lexemes:
+            lines.append("delete[](lexeme__" + str(j) + ");")
+        if len(body) > 1:
+            lines.append("this->sym_stack.resize(this->sym_stack.size() - " + str(len(body) - 1) + ");")
 
-        i += 1
+        reductions.append(lines)
+
+    return reductions
 
 
 # open the source file and emit class method definitions
-def create_body(action_table, goto_table, productions):
+# if no tables are given, the direct-coded parser is emitted instead of the table driven one
+# the tables are emitted into a source file of their own if separate_tables is set, and that file is only rewritten
+# when they change, so editing the user defined code does not make the c++ compiler go through them again
+def create_body(action_table, goto_table, productions, default_reductions, tables=None, separate_tables=False,
+                lexeme_views=False, incremental=False, parse_many=False, syntax_tree=False, stats=False):
     with open("my_little_parser.cpp", 'w') as body:
         # emit includes
+        if parse_many:
+            body.write("#include <atomic>\n"
+                       "#include <mutex>\n"
+                       "#include <thread>\n\n")
         body.write("#include \"my_little_parser.h\"\n\n")
+        if stats:
+            emit_stats(action_table, goto_table, productions, body)
+        emit_inputs(incremental, body)
 
-        emit_code(productions, body)
+        if tables is None:
+            if syntax_tree:
+                emit_add_syntax_node(body)
+            emit_direct_parse(action_table, goto_table, productions, default_reductions, lexeme_views, parse_many,
+                              syntax_tree, stats, body)
+            return
 
-        # emit action table
+        # emit user defined code, as one switch over all of the productions
         body.writelines([
-            "// ACTION table.\n"
-            "Parser::ActionTableEntry Parser::action_table[][" + str(len(action_table[0])) + "] = {\n"
+            "void Parser::reduce(int production) {\n"
+            "\tswitch (production) {\n"
         ])
-        for row in action_table[1:len(action_table)]:
-            line = "\t{"
-            for field in row:
-                if field is None:
-                    line += "Parser::ActionTableEntry('e', 0), "
-                elif field == 'a':
-                    line += "Parser::ActionTableEntry('a', 0), "
-                else:
-                    line += "Parser::ActionTableEntry(\'" + field[0] + "\', " + str(field[1]) + "), "
-            line += "},\n"
-            body.write(line)
-        body.write("};\n\n")
-
-        # emit GOTO table
+        reductions = reduction_code(productions, lexeme_views)
+        for production in range(len(productions)):
+            body.write("\tcase " + str(production) + ": { // " + production_to_string(productions[production]) + "\n")
+            for line in reductions[production]:
+                body.write("\t\t" + line + "\n")
+            body.writelines([
+                "\t\tbreak;\n"
+                "\t}\n"
+            ])
         body.writelines([
-            "// GOTO table.\n"
-            "ParserStates Parser::goto_table[][" + str(len(goto_table[0])) + "] = {\n"
+            "\t}\n"
+            "}\n\n"
         ])
-        for row in goto_table[1:len(goto_table)]:
-            line = "\t{"
-            for field in row:
-                if field is None:
-                    line += "ParserStates::SE, "
-                else:
-                    line += "ParserStates::S" + str(field) + ", "
-            line += "},\n"
-            body.write(line)
-        body.write("};\n\n")
 
-        # emit productions table
+        with io.StringIO() as table_source:
+            emit_tables(action_table, goto_table, productions, tables, table_source)
+            if separate_tables:
+                write_file("my_little_parser_tables.cpp",
+                           "#include \"my_little_parser.h\"\n\n" + table_source.getvalue())
+            else:
+                body.write(table_source.getvalue())
+
+        if incremental:
+            emit_incremental(lexeme_views, stats, body)
+        if syntax_tree:
+            emit_add_syntax_node(body)
+        emit_parse(lexeme_views, incremental, parse_many, syntax_tree, stats, body)
+
+
+# emit the clock which times the user defined code, and the function which writes the counters as JSON
+def emit_stats(action_table, goto_table, productions, body):
+    body.writelines([
+        "#ifdef MY_LITTLE_PARSER_TIME_ACTIONS\n"
+        "#if defined(__x86_64__) || defined(__i386__)\n"
+        "#include <x86intrin.h>\n"
+        "#define MY_LITTLE_PARSER_TICKS() static_cast<uint64_t>(__rdtsc())\n"
+        "#else\n"
+        "#include <chrono>\n"
+        "#define MY_LITTLE_PARSER_TICKS() \\\n"
+        "\tstatic_cast<uint64_t>(std::chrono::steady_clock::now().time_since_epoch().count())\n"
+        "#endif\n"
+        "#endif\n\n"
+        "void Parser::dump_stats(std::ostream& os) const {\n"
+        "\tstatic const char* const production_names[] = {\n"
+    ])
+    for production in productions:
+        body.write("\t\t\"" + production_to_string(production) + "\",\n")
+    body.writelines([
+        "\t};\n"
+        "\tconst std::size_t num_productions{" + str(len(productions)) + "};\n"
+        "\tconst std::size_t num_states{sizeof(this->stats.state_visits) / sizeof(this->stats.state_visits[0])};\n\n"
+        "\tos << \"{\\n\"\n"
+        "\t   << \"\\t\\\"tables\\\": \\\"" + tables_fingerprint(action_table, goto_table, productions) + "\\\",\\n\"\n"
+        "\t   << \"\\t\\\"shifts\\\": \" << this->stats.shifts << \",\\n\"\n"
+        "\t   << \"\\t\\\"reductions\\\": \" << this->stats.reductions << \",\\n\"\n"
+        "\t   << \"\\t\\\"max_states_depth\\\": \" << this->stats.max_states_depth << \",\\n\"\n"
+        "\t   << \"\\t\\\"max_symbols_depth\\\": \" << this->stats.max_symbols_depth << \",\\n\"\n"
+        "\t   << \"\\t\\\"productions\\\": [\\n\";\n"
+        "\tfor (std::size_t i = 0; i < num_productions; i++) {\n"
+        "\t\tos << \"\\t\\t{\\\"production\\\": \\\"\" << production_names[i]\n"
+        "\t\t   << \"\\\", \\\"reductions\\\": \" << this->stats.production_reductions[i]\n"
+        "\t\t   << \", \\\"action_ticks\\\": \" << this->stats.action_ticks[i]\n"
+        "\t\t   << (i + 1 < num_productions ? \"},\\n\" : \"}\\n\");\n"
+        "\t}\n"
+        "\tos << \"\\t],\\n\"\n"
+        "\t   << \"\\t\\\"state_visits\\\": [\";\n"
+        "\tfor (std::size_t i = 0; i < num_states; i++)\n"
+        "\t\tos << (i > 0 ? \", \" : \"\") << this->stats.state_visits[i];\n"
+        "\tos << \"]\\n\"\n"
+        "\t   << \"}\\n\";\n"
+        "}\n\n"
+    ])
+
+
+# the statement which counts a visit to the state, if the parser keeps the counters
+def count_visit(stats, state):
+    return "this->count_visit(" + state + ");\n" if stats else ""
+
+
+# the statement which counts a shift
+def count_shift(stats):
+    return "this->count_shift();\n" if stats else ""
+
+
+# run the code of a reduction, counting the reduction and timing the code if the parser keeps the counters
+def count_reduction(stats, production, code):
+    if not stats:
+        return code
+    return "this->count_reduction(" + production + ");\n" \
+           "#ifdef MY_LITTLE_PARSER_TIME_ACTIONS\n" \
+           "uint64_t ticks{MY_LITTLE_PARSER_TICKS()};\n" \
+           "#endif\n" + code + \
+           "#ifdef MY_LITTLE_PARSER_TIME_ACTIONS\n" \
+           "this->stats.action_ticks[" + production + "] += MY_LITTLE_PARSER_TICKS() - ticks;\n" \
+           "#endif\n"
+
+
+# indent every line of the code by the given number of tabs (preprocessor directives stay where they are)
+def indent(code, tabs):
+    return ''.join(("" if line.startswith('#') else "\t" * tabs) + line + "\n" for line in code.splitlines())
+
+
+# render a production as a comment
+def production_to_string(production):
+    return production[0].name + " -> " + ' '.join(sym.name for sym in production[1])
+
+
+# fingerprint of the ACTION and GOTO tables and of the numbering of the productions
+# dump_stats() writes it into the profile, so a profile is only used with the tables it was recorded by
+def tables_fingerprint(action_table, goto_table, productions):
+    tables = repr((action_table, goto_table, [production_to_string(production) for production in productions]))
+    return hashlib.sha256(tables.encode()).hexdigest()
+
+
+# write the file, unless it already holds exactly the same contents
+# this keeps its modification time, so build systems do not recompile it (or everything including it) for nothing
+def write_file(name, contents):
+    if os.path.exists(name):
+        with open(name, 'r') as file:
+            if file.read() == contents:
+                return
+
+    with open(name, 'w') as file:
+        file.write(contents)
+
+
+# emit an array of integers, with a given number of values per line
+def emit_array(declaration, values, source, per_line=16):
+    source.write(declaration + " = {")
+    for i in range(len(values)):
+        if i % per_line == 0:
+            source.write("\n\t")
+        source.write(str(values[i]) + ", ")
+    source.write("\n};\n\n")
+
+
+# emit the tables and the heads and lengths of the productions
+# all of them are arrays of plain integers, which need no code to run at startup
+def emit_tables(action_table, goto_table, productions, tables, source):
+    if isinstance(tables, CompressedTables):
+        emit_array("const " + tables.action_base_type + " Parser::action_base[]", tables.action_base, source)
+        emit_array("const " + tables.default_action_type + " Parser::default_actions[]", tables.default_actions,
+                   source)
+        emit_array("const " + tables.goto_base_type + " Parser::goto_base[]", tables.goto_base, source)
+        emit_array("const " + tables.default_goto_type + " Parser::default_gotos[]", tables.default_gotos, source)
+        emit_array("const " + tables.action_type + " Parser::table[]", tables.table, source)
+        emit_array("const " + tables.check_type + " Parser::check[]", tables.check, source)
+    else:
+        source.write("// ACTION table.\n"
+                     "const " + tables.action_type + " Parser::action_table[][" + str(len(action_table[0])) + "] = {\n")
+        for row in tables.actions:
+            source.write("\t{" + ", ".join(str(action) for action in row) + "},\n")
+        source.write("};\n\n")
+
+        source.write("// Default actions.\n")
+        emit_array("const " + tables.default_action_type + " Parser::default_actions[]", tables.default_actions,
+                   source)
+
+        source.write("// GOTO table.\n"
+                     "const " + tables.state_type + " Parser::goto_table[][" + str(len(goto_table[0])) + "] = {\n")
+        for row in tables.gotos:
+            source.write("\t{" + ", ".join(str(target) for target in row) + "},\n")
+        source.write("};\n\n")
+
+    (heads, lengths, production_type) = production_arrays(goto_table, productions)
+    source.write("// Heads and body lengths of the productions.\n")
+    emit_array("const " + production_type + " Parser::production_heads[]", heads, source)
+    emit_array("const " + production_type + " Parser::production_lengths[]", lengths, source)
+
+
+# heads (numbered as the columns of the GOTO table) and body lengths of the productions, and the type which fits them
+def production_arrays(goto_table, productions):
+    heads = [goto_table[0].index(head.name) for (head, body) in productions]
+    lengths = [0 if body[0].name == "eps" else len(body) for (head, body) in productions]
+
+    return heads, lengths, integer_type(0, max(heads + lengths))
+
+
+# the statement which stores the lexeme of the current input token into the value of the terminal
+def store_lexeme(lexeme_views):
+    if lexeme_views:
+        return "term.lexeme = this->lexemes.store(input.lexeme(), input.lexeme_length());"
+    else:
+        return "term.lexeme = new char[input.lexeme_length() + 1];\n" \
+               "memcpy(term.lexeme, input.lexeme(), input.lexeme_length());\n" \
+               "term.lexeme[input.lexeme_length()] = '\\0';"
+
+
+# emit the inputs of the parsing algorithm
+# an input gives the type of the current token (fetching it only then), its lexeme, and moves on to the next token
+# only pushed tokens can run out, and the parsing algorithm checks for that only if may_run_out is set
+def emit_inputs(incremental, body):
+    body.writelines([
+        "namespace {\n\n"
+        "// Input which pulls the tokens from the lexer.\n"
+        "class LexerInput {\n"
+        "\tLexer& lexer;\n"
+        "\tstd::shared_ptr<Token> token;\n"
+        "public:\n"
+        "\tstatic constexpr bool may_run_out{false};\n\n"
+        "\tLexerInput(Lexer& lexer) : lexer(lexer) {}\n\n"
+        "\tint token_type() {\n"
+        "\t\tif (this->token == nullptr)\n"
+        "\t\t\tthis->token = this->lexer.get_next_word();\n"
+        "\t\treturn static_cast<int>(this->token->get_token_type());\n"
+        "\t}\n"
+        "\tconst char* lexeme() const { return this->token->get_lexeme().c_str(); }\n"
+        "\tstd::size_t lexeme_length() const { return this->token->get_lexeme().size(); }\n"
+        "\tvoid next() { this->token = nullptr; }\n"
+        "};\n\n"
+        "// Input which reads the tokens from an array of token spans, asking the\n"
+        "// source (if there is one) for the next batch when they run out.\n"
+        "class SpanInput {\n"
+        "\tconst TokenSpan* token;\n"
+        "\tconst TokenSpan* end;\n"
+        "\tconst char* text;\n"
+        "\tTokenSource* source;\n"
+        "public:\n"
+        "\tstatic constexpr bool may_run_out{false};\n\n"
+        "\tSpanInput(const TokenSpan* tokens, std::size_t count, const char* text, TokenSource* source = nullptr)\n"
+        "\t\t: token(tokens), end(tokens + count), text(text), source(source) {}\n\n"
+        "\tint token_type() {\n"
+        "\t\twhile (this->token == this->end) {\n"
+        "\t\t\tif (this->source == nullptr || !this->source->fill())\n"
+        "\t\t\t\treturn TokenSource::end_of_input;\n"
+        "\t\t\tthis->token = this->source->tokens.data();\n"
+        "\t\t\tthis->end = this->token + this->source->tokens.size();\n"
+        "\t\t\tthis->text = this->source->text.data();\n"
+        "\t\t}\n"
+        "\t\treturn static_cast<int>(this->token->token_type);\n"
+        "\t}\n"
+        "\tconst char* lexeme() const { return this->text + this->token->offset; }\n"
+        "\tstd::size_t lexeme_length() const { return this->token->length; }\n"
+        "\tvoid next() { this->token++; }\n"
+    ])
+    if incremental:
+        body.write("\tvoid skip(std::size_t count) { this->token += count; }\n")
+    body.writelines([
+        "};\n\n"
+        "// Input which holds a single pushed token. Its type becomes negative once\n"
+        "// the token is consumed.\n"
+        "class PushInput {\n"
+        "\tint type;\n"
+        "\tconst char* text;\n"
+        "\tstd::size_t length;\n"
+        "public:\n"
+        "\tstatic constexpr bool may_run_out{true};\n\n"
+        "\tPushInput(TokenType token_type, const char* text, std::size_t length)\n"
+        "\t\t: type(static_cast<int>(token_type)), text(text), length(length) {}\n\n"
+        "\tint token_type() const { return this->type; }\n"
+        "\tconst char* lexeme() const { return this->text; }\n"
+        "\tstd::size_t lexeme_length() const { return this->length; }\n"
+        "\tvoid next() { this->type = -1; }\n"
+        "};\n\n"
+        "}\n\n"
+    ])
+
+
+# emit the public entry points, which start a parse and run the parsing algorithm on their inputs
+def emit_entry_points(lexeme_views, incremental, parse_many, syntax_tree, body):
+    body.writelines([
+        "\n"
+        "void Parser::start() {\n"
+        "\t// Initialize the states stack, as well as the parse tree.\n"
+        "\tthis->states_stack.clear();\n"
+        "\tthis->sym_stack.clear();\n" + clear_lexemes(lexeme_views) + clear_tree(incremental) +
+        clear_syntax_tree(syntax_tree) +
+        "\tthis->states_stack.push_back(ParserStates::S0);\n"
+        "}\n\n"
+        "bool Parser::parse() {\n"
+        "\tLexerInput input{*this->lexer};\n"
+        "\tthis->start();\n"
+        "\treturn this->resume(input) == PushResult::ACCEPT;\n"
+        "}\n\n"
+        "bool Parser::parse(Lexer& lexer) {\n"
+        "\tthis->lexer = &lexer;\n"
+        "\treturn this->parse();\n"
+        "}\n\n"
+        "bool Parser::parse(const TokenSpan* tokens, std::size_t count, const char* text) {\n"
+        "\tSpanInput input{tokens, count, text};\n"
+        "\tthis->start();\n"
+        "\treturn this->resume(input) == PushResult::ACCEPT;\n"
+        "}\n\n"
+        "bool Parser::parse(TokenSource& source) {\n"
+        "\tSpanInput input{nullptr, 0, nullptr, &source};\n"
+        "\tthis->start();\n"
+        "\treturn this->resume(input) == PushResult::ACCEPT;\n"
+        "}\n\n"
+        "PushResult Parser::push(TokenType token_type, const char* lexeme, std::size_t length) {\n"
+        "\t// The states stack is emptied when the parse is over.\n"
+        "\tif (this->states_stack.empty())\n"
+        "\t\treturn PushResult::ERROR;\n\n"
+        "\tPushInput input{token_type, lexeme, length};\n"
+        "\tPushResult result{this->resume(input)};\n"
+        "\tif (result != PushResult::NEED_MORE)\n"
+        "\t\tthis->states_stack.clear();\n"
+        "\treturn result;\n"
+        "}\n"
+    ])
+    if parse_many:
+        emit_parse_many(body)
+
+
+# emit the driver which parses many files on a pool of threads
+# the threads take the files through a shared atomic counter, and each of them only writes the results of the files
+# it took, so there is no lock at all
+def emit_parse_many(body):
+    body.writelines([
+        "\n"
+        "std::vector<ParseResult> parse_many(const std::vector<std::string>& inputs, unsigned n_threads,\n"
+        "                                    const SourceFactory& open_source) {\n"
+        "\tstd::vector<ParseResult> results(inputs.size());\n"
+        "\t// Index of the next input to parse.\n"
+        "\tstd::atomic<std::size_t> next{0};\n\n"
+        "\tauto work = [&inputs, &open_source, &results, &next]() {\n"
+        "\t\tParser parser;\n"
+        "\t\tfor (std::size_t i = next++; i < inputs.size(); i = next++) {\n"
+        "\t\t\tParseResult& result{results[i]};\n"
+        "\t\t\ttry {\n"
+        "\t\t\t\tstd::unique_ptr<TokenSource> source{open_source(inputs[i])};\n"
+        "\t\t\t\tif (!source) {\n"
+        "\t\t\t\t\tresult.error = \"Input file not opened correctly!\";\n"
+        "\t\t\t\t\tcontinue;\n"
+        "\t\t\t\t}\n"
+        "\t\t\t\tresult.accepted = parser.parse(*source);\n"
+        "\t\t\t\tif (result.accepted)\n"
+        "\t\t\t\t\tresult.value = parser.get_top_value();\n"
+        "\t\t\t\telse\n"
+        "\t\t\t\t\tresult.error = \"Syntax error!\";\n"
+        "\t\t\t} catch (const std::exception& e) {\n"
+        "\t\t\t\tresult.accepted = false;\n"
+        "\t\t\t\tresult.error = e.what();\n"
+        "\t\t\t}\n"
+        "\t\t}\n"
+        "\t};\n\n"
+        "\t// The calling thread is one of the workers.\n"
+        "\tstd::vector<std::thread> workers;\n"
+        "\tfor (unsigned i = 1; i < n_threads && i < inputs.size(); i++)\n"
+        "\t\tworkers.emplace_back(work);\n"
+        "\twork();\n"
+        "\tfor (std::thread& worker : workers)\n"
+        "\t\tworker.join();\n\n"
+        "\treturn results;\n"
+        "}\n\n"
+        "namespace {\n\n"
+        "// Held while a lexer runs, since lexers made by my lexer generator share a\n"
+        "// static line counter.\n"
+        "std::mutex lexer_mutex;\n\n"
+        "// Source which owns its lexer, and fills its batches under the lexer mutex.\n"
+        "class LexerSource : public TokenSource {\n"
+        "\tLexer lexer;\n"
+        "\tTokenBatcher<Lexer> batcher;\n"
+        "public:\n"
+        "\texplicit LexerSource(const char* path) : lexer(path), batcher(lexer) {}\n\n"
+        "\tbool fill() override {\n"
+        "\t\tstd::lock_guard<std::mutex> lock(lexer_mutex);\n"
+        "\t\tbool filled{this->batcher.fill()};\n"
+        "\t\tthis->tokens.swap(this->batcher.tokens);\n"
+        "\t\tthis->text.swap(this->batcher.text);\n"
+        "\t\treturn filled;\n"
+        "\t}\n"
+        "};\n\n"
+        "} // namespace\n\n"
+        "std::vector<ParseResult> parse_many(const std::vector<std::string>& paths, unsigned n_threads) {\n"
+        "\treturn parse_many(paths, n_threads, [](const std::string& path) -> std::unique_ptr<TokenSource> {\n"
+        "\t\t// The lexer gives up on the whole program if it can not open its file.\n"
+        "\t\tif (!std::ifstream(path).is_open())\n"
+        "\t\t\treturn nullptr;\n"
+        "\t\tstd::lock_guard<std::mutex> lock(lexer_mutex);\n"
+        "\t\treturn std::unique_ptr<TokenSource>(new LexerSource(path.c_str()));\n"
+        "\t});\n"
+        "}\n"
+    ])
+
+
+# the statement which drops the lexemes of the previous parse
+def clear_lexemes(lexeme_views):
+    return "\tthis->lexemes.clear();\n" if lexeme_views else ""
+
+
+# the statements which drop the tree of the previous parse
+def clear_tree(incremental):
+    if not incremental:
+        return ""
+    return "\tthis->nodes.clear();\n" \
+           "\tthis->children.clear();\n" \
+           "\tthis->node_stack.clear();\n" \
+           "\tthis->root = ParseNode::no_node;\n"
+
+
+# the statements which drop the syntax tree of the previous parse, keeping its memory
+def clear_syntax_tree(syntax_tree):
+    if not syntax_tree:
+        return ""
+    return "\tthis->syntax_tree.clear();\n" \
+           "\tthis->syntax_stack.clear();\n" \
+           "\tthis->num_tokens = 0;\n"
+
+
+# the statement which adds the node of the token which is being shifted to the syntax tree
+def shift_syntax_node(syntax_tree):
+    if not syntax_tree:
+        return ""
+    return "this->syntax_stack.push_back(SyntaxNode{static_cast<decltype(SyntaxNode::kind)>(input.token_type()), -1, " \
+           "0, 0, this->num_tokens++, 1});\n"
+
+
+# the statement which makes the root of the syntax tree, once the parse is accepted
+def accept_syntax_tree(syntax_tree):
+    return "this->syntax_tree.push_back(this->syntax_stack.back());\n" if syntax_tree else ""
+
+
+# emit the function which adds the node of a reduced production to the syntax tree
+# the nodes of its body are moved from the stack to the end of the tree, which keeps them next to each other
+def emit_add_syntax_node(body):
+    body.writelines([
+        "void Parser::add_syntax_node(int kind, int production, std::size_t length) {\n"
+        "\tSyntaxNode node{};\n"
+        "\tnode.kind = static_cast<decltype(node.kind)>(kind);\n"
+        "\tnode.production = static_cast<decltype(node.production)>(production);\n"
+        "\tnode.first_child = static_cast<uint32_t>(this->syntax_tree.size());\n"
+        "\tnode.num_children = static_cast<uint32_t>(length);\n"
+        "\tnode.first_token = this->num_tokens;\n"
+        "\tif (length > 0) {\n"
+        "\t\tnode.first_token = this->syntax_stack[this->syntax_stack.size() - length].first_token;\n"
+        "\t\tnode.num_tokens = this->syntax_stack.back().first_token + this->syntax_stack.back().num_tokens\n"
+        "\t\t                  - node.first_token;\n"
+        "\t}\n"
+        "\tthis->syntax_tree.insert(this->syntax_tree.end(), this->syntax_stack.end() - length, this->syntax_stack.end());\n"
+        "\tthis->syntax_stack.resize(this->syntax_stack.size() - length);\n"
+        "\tthis->syntax_stack.push_back(node);\n"
+        "}\n\n"
+    ])
+
+
+# emit the functions which build the tree of the parse, and the incremental parsing algorithm
+#
+# this is the state matching algorithm of Wagner and Graham: the subtrees of the previous parse are visited in the order
+# of the input, and a subtree which begins at the next token is shifted as a whole (along with its value), if the parser
+# is in the state in which that subtree was begun, and neither its tokens nor the lookahead token which followed it were
+# edited (the parser would then go through exactly the same steps to build it again)
+# subtrees which the edit touched, or which can not be reused where they are, are broken down into their children, and
+# the tokens which are left over are parsed as usual
+def emit_incremental(lexeme_views, stats, body):
+    body.writelines([
+        "void Parser::add_token_node() {\n"
+        "\tthis->node_stack.push_back(static_cast<uint32_t>(this->nodes.size()));\n"
+        "\tthis->nodes.push_back(ParseNode{0, -1, 1, 0, 0, {}});\n"
+        "}\n\n"
+        "void Parser::add_node(int production, int state) {\n"
+        "\tstd::size_t length{this->production_lengths[production]};\n"
+        "\tParseNode node{};\n"
+        "\tnode.state = state;\n"
+        "\tnode.symbol = this->production_heads[production];\n"
+        "\tnode.first_child = static_cast<uint32_t>(this->children.size());\n"
+        "\tnode.num_children = static_cast<uint32_t>(length);\n"
+        "\tnode.value = this->sym_stack.back();\n"
+        "\tfor (std::size_t i = this->node_stack.size() - length; i < this->node_stack.size(); i++) {\n"
+        "\t\tthis->children.push_back(this->node_stack[i]);\n"
+        "\t\tnode.width += this->nodes[this->node_stack[i]].width;\n"
+        "\t}\n"
+        "\tthis->node_stack.resize(this->node_stack.size() - length);\n"
+        "\tthis->node_stack.push_back(static_cast<uint32_t>(this->nodes.size()));\n"
+        "\tthis->nodes.push_back(node);\n"
+        "}\n\n"
+        "void Parser::compact_tree() {\n"
+        "\t// The tree is copied level by level. A subtree is reused at most once, so\n"
+        "\t// every node is copied once.\n"
+        "\tstd::vector<ParseNode> nodes{this->nodes[this->root]};\n"
+        "\tstd::vector<uint32_t> children;\n"
+        "\tfor (std::size_t i = 0; i < nodes.size(); i++) {\n"
+        "\t\tuint32_t first_child{nodes[i].first_child};\n"
+        "\t\tnodes[i].first_child = static_cast<uint32_t>(children.size());\n"
+        "\t\tfor (uint32_t j = 0; j < nodes[i].num_children; j++) {\n"
+        "\t\t\tchildren.push_back(static_cast<uint32_t>(nodes.size()));\n"
+        "\t\t\tnodes.push_back(this->nodes[this->children[first_child + j]]);\n"
+        "\t\t}\n"
+        "\t}\n\n"
+        "\tthis->nodes.swap(nodes);\n"
+        "\tthis->children.swap(children);\n"
+        "\tthis->root = 0;\n"
+        "\tthis->live_nodes = this->nodes.size();\n"
+        "}\n\n"
+        "bool Parser::reparse(const TokenSpan* tokens, std::size_t count, const char* text,\n"
+        "                     std::size_t edit_begin, std::size_t edit_end, std::size_t inserted) {\n"
+        "\t// Without the tree of the last parse, the whole input is parsed again.\n"
+        "\tif (this->root == ParseNode::no_node)\n"
+        "\t\treturn this->parse(tokens, count, text);\n\n"
+        "\t// Subtrees of the last parse which are yet to be reused or broken down,\n"
+        "\t// along with their positions in the last input. The next one is on top.\n"
+        "\tstd::vector<std::pair<uint32_t, std::size_t>> pending{{this->root, 0}};\n"
+        "\tSpanInput input{tokens, count, text};\n"
+        "\tstd::size_t position{0};\n\n"
+        "\t// Nodes of the last parse are kept, the new tree is built over them.\n"
+        "\tthis->states_stack.clear();\n"
+        "\tthis->sym_stack.clear();\n"
+        "\tthis->node_stack.clear();\n"
+        "\tthis->root = ParseNode::no_node;\n"
+        "\tthis->states_stack.push_back(ParserStates::S0);\n\n"
+        "\twhile (true) {\n"
+        "\t\tint state{static_cast<int>(this->states_stack.back())};\n"
+        "\t\tint action;\n" + indent(count_visit(stats, "state"), 2) + "\n"
+        "\t\tif (reduces_by_default(state))\n"
+        "\t\t\taction = -static_cast<int>(this->default_actions[state]);\n"
+        "\t\telse\n"
+        "\t\t\taction = lookup_action(state, input.token_type());\n\n"
+        "\t\t// Shift action. Look for a subtree which begins with the token first.\n"
+        "\t\tif (action > 0) {\n"
+        "\t\t\tuint32_t reused{ParseNode::no_node};\n"
+        "\t\t\twhile (!pending.empty()) {\n"
+        "\t\t\t\tuint32_t subtree{pending.back().first};\n"
+        "\t\t\t\tstd::size_t old_position{pending.back().second};\n"
+        "\t\t\t\tconst ParseNode& node{this->nodes[subtree]};\n"
+        "\t\t\t\t// The subtree is intact if the edit did not touch its tokens, nor the\n"
+        "\t\t\t\t// lookahead token which followed it.\n"
+        "\t\t\t\tbool intact{old_position + node.width < edit_begin || old_position >= edit_end};\n"
+        "\t\t\t\tstd::size_t new_position{old_position < edit_begin ? old_position\n"
+        "\t\t\t\t                         : old_position - (edit_end - edit_begin) + inserted};\n"
+        "\t\t\t\tif (intact && new_position > position)\n"
+        "\t\t\t\t\tbreak;\n"
+        "\t\t\t\tpending.pop_back();\n"
+        "\t\t\t\tif (intact && new_position + node.width <= position)\n"
+        "\t\t\t\t\tcontinue;\n"
+        "\t\t\t\tif (intact && new_position == position && static_cast<int>(node.state) == state) {\n"
+        "\t\t\t\t\treused = subtree;\n"
+        "\t\t\t\t\tbreak;\n"
+        "\t\t\t\t}\n\n"
+        "\t\t\t\t// Break the subtree down into the children which span some tokens.\n"
+        "\t\t\t\tstd::size_t child_position{old_position + node.width};\n"
+        "\t\t\t\tfor (uint32_t i = node.num_children; i-- > 0;) {\n"
+        "\t\t\t\t\tuint32_t child{this->children[node.first_child + i]};\n"
+        "\t\t\t\t\tchild_position -= this->nodes[child].width;\n"
+        "\t\t\t\t\tif (this->nodes[child].symbol >= 0 && this->nodes[child].width > 0)\n"
+        "\t\t\t\t\t\tpending.emplace_back(child, child_position);\n"
+        "\t\t\t\t}\n"
+        "\t\t\t}\n\n"
+        "\t\t\tif (reused != ParseNode::no_node) {\n"
+        "\t\t\t\tconst ParseNode& node{this->nodes[reused]};\n"
+        "\t\t\t\tthis->states_stack.push_back(static_cast<ParserStates>(lookup_goto(state, node.symbol)));\n"
+        "\t\t\t\tthis->sym_stack.push_back(node.value);\n"
+        "\t\t\t\tthis->node_stack.push_back(reused);\n"
+        "\t\t\t\tinput.skip(node.width);\n"
+        "\t\t\t\tposition += node.width;\n"
+        "\t\t\t\tcontinue;\n"
+        "\t\t\t}\n\n"
+        "\t\t\tunion types term;\n" + indent(store_lexeme(lexeme_views), 3) +
+        "\t\t\tthis->sym_stack.push_back(term);\n"
+        "\t\t\tthis->add_token_node();\n" + indent(count_shift(stats), 3) +
+        "\t\t\tinput.next();\n"
+        "\t\t\tposition++;\n"
+        "\t\t\tthis->states_stack.push_back(static_cast<ParserStates>(action));\n"
+        "\t\t// Reduce action.\n"
+        "\t\t} else if (action < 0 && action != accept_action) {\n"
+        "\t\t\tint production{-action - 1};\n"
+        "\t\t\tthis->states_stack.resize(this->states_stack.size() - this->production_lengths[production]);\n"
+        "\t\t\tint top{static_cast<int>(this->states_stack.back())};\n"
+        "\t\t\tthis->states_stack.push_back(static_cast<ParserStates>(lookup_goto(top, this->production_heads[production])));\n"
+        + indent(count_reduction(stats, "production", "this->reduce(production);\n"), 3) +
+        "\t\t\tthis->add_node(production, top);\n"
+        "\t\t// Accept action.\n"
+        "\t\t} else if (action == accept_action) {\n"
+        "\t\t\tthis->root = this->node_stack.back();\n"
+        "\t\t\t// Once more than half of the nodes are not in the tree any more, they are\n"
+        "\t\t\t// dropped. This copies the whole tree, but at most once for every node\n"
+        "\t\t\t// added since the last time.\n"
+        "\t\t\tif (this->nodes.size() > 2 * this->live_nodes)\n"
+        "\t\t\t\tthis->compact_tree();\n"
+        "\t\t\treturn true;\n"
+        "\t\t// Error action.\n"
+        "\t\t} else {\n"
+        "\t\t\treturn false;\n"
+        "\t\t}\n"
+        "\t}\n"
+        "}\n\n"
+    ])
+
+
+# emit the parsing algorithm
+# the incremental parser also builds the tree of the parse
+def emit_parse(lexeme_views, incremental, parse_many, syntax_tree, stats, body):
+    body.writelines([
+        "template <typename Input>\n"
+        "PushResult Parser::resume(Input& input) {\n"
+        "\t// Tokens are fetched from the input only when the parser needs to look at\n"
+        "\t// them.\n"
+        "\twhile (true) {\n"
+        "\t\tint state{static_cast<int>(this->states_stack.back())};\n"
+        "\t\tint action;\n" + indent(count_visit(stats, "state"), 2) + "\n"
+        "\t\t// Some states reduce by their default action, other states look\n"
+        "\t\t// their action up in the ACTION table.\n"
+        "\t\tif (reduces_by_default(state)) {\n"
+        "\t\t\taction = -static_cast<int>(this->default_actions[state]);\n"
+        "\t\t} else {\n"
+        "\t\t\tint token_type{input.token_type()};\n"
+        "\t\t\t// Wait for the next token to be pushed.\n"
+        "\t\t\tif (Input::may_run_out && token_type < 0)\n"
+        "\t\t\t\treturn PushResult::NEED_MORE;\n"
+        "\t\t\taction = lookup_action(state, token_type);\n"
+        "\t\t}\n\n"
+        "\t\t// Shift action.\n"
+        "\t\tif (action > 0) {\n"
+        "\t\t\t// Push the token lexeme to the symbol stack.\n"
+        "\t\t\tunion types term;\n" + indent(store_lexeme(lexeme_views), 3) +
+        "\t\t\tthis->sym_stack.push_back(term);\n" + ("\t\t\tthis->add_token_node();\n" if incremental else "") +
+        indent(shift_syntax_node(syntax_tree), 3) + indent(count_shift(stats), 3) + "\n"
+        "\t\t\t// The token is consumed, the next one is fetched when it is needed.\n"
+        "\t\t\tinput.next();\n"
+        "\t\t\tthis->states_stack.push_back(static_cast<ParserStates>(action));\n"
+        "\t\t// Reduce action.\n"
+        "\t\t} else if (action < 0 && action != accept_action) {\n"
+        "\t\t\tint production{-action - 1};\n\n"
+        "\t\t\t// Pop the states off the stack. \n"
+        "\t\t\tthis->states_stack.resize(this->states_stack.size() - this->production_lengths[production]);\n"
+        "\t\t\tint top{static_cast<int>(this->states_stack.back())};\n"
+        "\t\t\tthis->states_stack.push_back(static_cast<ParserStates>(lookup_goto(top, this->production_heads[production])));\n"
+        "\t\t\t// Call the user defined code.\n"
+        + indent(count_reduction(stats, "production", "this->reduce(production);\n"), 3) +
+        ("\t\t\tthis->add_node(production, top);\n" if incremental else "") +
+        ("\t\t\tthis->add_syntax_node(SyntaxNode::first_nonterminal + this->production_heads[production], production,\n"
+         "\t\t\t                      this->production_lengths[production]);\n" if syntax_tree else "") +
+        "\t\t// Accept action. This ends the parsing process successfully.\n"
+        "\t\t} else if (action == accept_action) {\n" +
+        ("\t\t\tthis->root = this->node_stack.back();\n"
+         "\t\t\tthis->live_nodes = this->nodes.size();\n" if incremental else "") +
+        indent(accept_syntax_tree(syntax_tree), 3) +
+        "\t\t\treturn PushResult::ACCEPT;\n"
+        "\t\t// Error action. This ends the parsing process unsuccessfully.\n"
+        "\t\t} else {\n"
+        "\t\t\treturn PushResult::ERROR;\n"
+        "\t\t}\n"
+        "\t}\n"
+        "}\n"
+    ])
+    emit_entry_points(lexeme_views, incremental, parse_many, syntax_tree, body)
+
+
+# emit the direct-coded parsing algorithm, where every state of the automaton is a block of code
+# a state pushes itself onto the states stack, then it either reduces right away (if it is consistent), or switches on
+# the type of the input token, shifting and jumping straight to the next state, or jumping to the code of a reduction
+# a reduction pops its states, calls the user defined code and jumps to the GOTO dispatch of its head, which picks the
+# next state by the state on top of the stack
+# GOTO dispatch uses a table of label addresses with compilers which support computed goto (GCC and Clang), and
+# a switch otherwise (or if MY_LITTLE_PARSER_NO_COMPUTED_GOTO is defined)
+# the parsing algorithm begins by jumping into the state on top of the stack, so that it can resume after a push
+def emit_direct_parse(action_table, goto_table, productions, default_reductions, lexeme_views, parse_many, syntax_tree,
+                      stats, body):
+    num_states = len(action_table) - 1
+    terminal_names = action_table[0]
+    reductions_code = reduction_code(productions, lexeme_views)
+
+    body.writelines([
+        "#if (defined(__GNUC__) || defined(__clang__)) && !defined(MY_LITTLE_PARSER_NO_COMPUTED_GOTO)\n"
+        "#define MY_LITTLE_PARSER_COMPUTED_GOTO\n"
+        "#endif\n\n"
+        "template <typename Input>\n"
+        "void Parser::shift_token(Input& input) {\n"
+        "\tunion types term;\n" + indent(store_lexeme(lexeme_views), 1) +
+        "\tthis->sym_stack.push_back(term);\n" + indent(shift_syntax_node(syntax_tree), 1) + indent(count_shift(stats), 1) +
+        "\tinput.next();\n"
+        "}\n\n"
+        "template <typename Input>\n"
+        "PushResult Parser::resume(Input& input) {\n"
+        "\t// State on top of the stack, after a reduction.\n"
+        "\tint top;\n\n"
+        "\t// Continue in the state on top of the stack. Tokens are fetched from the\n"
+        "\t// input only when the parser needs to look at them.\n"
+        "\tswitch (static_cast<int>(this->states_stack.back())) {\n"
+    ])
+    for i in range(num_states):
+        body.write("\tcase " + str(i) + ": goto resume_" + str(i) + ";\n")
+    body.writelines([
+        "\tdefault: goto parse_error;\n"
+        "\t}\n\n"
+    ])
+
+    # states which are jumped to (the starting state is usually only resumed, after start() pushes it)
+    # a state is resumed past the point where it pushes itself
+    targets = {action[1] for row in action_table[1:len(action_table)] for action in row
+               if action is not None and action != 'a' and action[0] == 's'}
+    targets |= {target for row in goto_table[1:len(goto_table)] for target in row if target is not None}
+
+    # reductions which are jumped to
+    reductions = set()
+    for i in range(num_states):
+        if i in targets:
+            body.write("state_" + str(i) + ":\n")
         body.writelines([
-            "// Table of productions.\n"
-            "Parser::Production Parser::productions[] = {\n"
+            "\tthis->states_stack.push_back(ParserStates::S" + str(i) + ");\n"
+            "resume_" + str(i) + ":\n"
         ])
-        i = 0
-        head = productions[0][0]
-        for production in productions:
-            prod_len = len(production[1])
-            if production[1][0].name == "eps":
-                prod_len = 0
-            line = "\tstd::make_tuple(Nonterminals::" + production[0].name + ", " \
-                   + str(prod_len) + ", "
-
-            if production[0] != head:
-                head = production[0]
-                i = 0
-            code = head.code[i]
-
-            if (code == '' and len(production[1]) > 1) or production[1][0].name == "eps":
-                line += "nullptr), \n"
+        body.write(indent(count_visit(stats, str(i)), 1))
+
+        (production, consistent) = default_reductions[i]
+        if consistent:
+            body.write("\tgoto reduce_" + str(production) + ";\n\n")
+            reductions.add(production)
+            continue
+
+        body.write("\tswitch (input.token_type()) {\n")
+        # terminals with the same action share the code
+        cases = dict()
+        for sym in range(len(terminal_names)):
+            action = action_table[i + 1][sym]
+            if action is not None:
+                cases.setdefault(action, []).append(sym)
+        for (action, syms) in cases.items():
+            for sym in syms:
+                body.write("\tcase " + str(sym) + ": // " + terminal_names[sym] + "\n")
+            if action == 'a':
+                body.write(indent(accept_syntax_tree(syntax_tree), 2) + "\t\treturn PushResult::ACCEPT;\n")
+            elif action[0] == 's':
+                body.writelines([
+                    "\t\tthis->shift_token(input);\n"
+                    "\t\tgoto state_" + str(action[1]) + ";\n"
+                ])
             else:
-                line += head.name + "__" + str(i) + "), \n"
-            body.write(line)
+                body.write("\t\tgoto reduce_" + str(action[1]) + ";\n")
+                reductions.add(action[1])
+        body.writelines([
+            "\tdefault:\n"
+            "\t\tgoto token_error;\n"
+            "\t}\n\n"
+        ])
 
-            i += 1
+    # emit the reductions
+    heads = set()
+    for production in sorted(reductions):
+        (head, production_body) = productions[production]
+        length = 0 if production_body[0].name == "eps" else len(production_body)
+        body.write("reduce_" + str(production) + ": // " + production_to_string(productions[production]) + "\n")
+        if length > 0:
+            body.write("\tthis->states_stack.resize(this->states_stack.size() - " + str(length) + ");\n")
+        body.write("\t{\n")
+        code = ''.join(line + "\n" for line in reductions_code[production])
+        body.write(indent(count_reduction(stats, str(production), code), 2))
+        if syntax_tree:
+            body.write("\t\tthis->add_syntax_node(SyntaxNode::first_nonterminal + " + str(goto_table[0].index(head.name))
+                       + ", " + str(production) + ", " + str(length) + ");\n")
+        body.writelines([
+            "\t}\n"
+            "\tgoto goto_" + head.name + ";\n\n"
+        ])
+        heads.add(head.name)
 
-        body.write("};\n\n")
+    # emit the GOTO dispatches
+    for column in range(len(goto_table[0])):
+        name = goto_table[0][column]
+        if name not in heads:
+            continue
 
-        # emit the parser body
+        targets = [goto_table[i + 1][column] for i in range(num_states)]
+        body.writelines([
+            "goto_" + name + ":\n"
+            "\ttop = static_cast<int>(this->states_stack.back());\n"
+            "#ifdef MY_LITTLE_PARSER_COMPUTED_GOTO\n"
+            "\t{\n"
+            "\t\tstatic void* const targets[] = {"
+        ])
+        for i in range(num_states):
+            if i % 8 == 0:
+                body.write("\n\t\t\t")
+            body.write("&&parse_error, " if targets[i] is None else "&&state_" + str(targets[i]) + ", ")
         body.writelines([
-            "bool Parser::parse() {\n"
-            "\t// Get the first token from the lexer and initialize the states stack,\n"
-            "\t// as well as the parse tree.\n"
-            "\tthis->current_input = this->lexer.get_next_word();\n"
-            "\tthis->states_stack.push(ParserStates::S0);\n\n"
-            "\twhile (true) {\n"
-            "\t\tTokenType token_type{this->current_input->get_token_type()};\n"
-            "\t\tActionTableEntry action = this->action_table[static_cast<uint8_t>(this->states_stack.top())]\n"
-            "\t\t\t\t\t\t\t\t\t\t\t\t\t[static_cast<uint16_t>(token_type)];\n\n"
-            "\t\t// Shift action.\n"
-            "\t\tif (action.first == 's') {\n"
-            "\t\t\t// Push the token lexeme to the symbol stack.\n"
-            "\t\t\tunion types term;\n"
-            "\t\t\tterm.lexeme = new char[this->current_input->get_lexeme().size() + 1];\n"
-            "\t\t\tstrcpy(term.lexeme, this->current_input->get_lexeme().c_str());\n"
-            "\t\t\tthis->sym_stack.push(term);\n\n"
-            "\t\t\t// Get the next input symbol and add it to the parse tree frontier.\n"
-            "\t\t\tthis->current_input = this->lexer.get_next_word();\n"
-            "\t\t\tthis->states_stack.push(static_cast<ParserStates>(action.second));\n"
-            "\t\t// Reduce action.\n"
-            "\t\t} else if (action.first == 'r') {\n"
-            "\t\t\tProduction prod{this->productions[action.second]};\n\n"
-            "\t\t\t// Pop the states off the stack. \n"
-            "\t\t\tfor (uint8_t i = 0; i < std::get<1>(prod); i++) {\n"
-            "\t\t\t\tthis->states_stack.pop();\n"
-            "\t\t\t}\n"
-            "\t\t\tthis->states_stack.push(this->goto_table[static_cast<uint8_t>(this->states_stack.top())]\n"
-            "\t\t\t\t\t\t\t\t\t\t\t\t\t[static_cast<uint8_t>(std::get<0>(prod))]);\n"
-            "\t\t\t// Call the user defined code.\n"
-            "\t\t\tif (std::get<2>(prod) != nullptr) {\n"
-            "\t\t\t\tFunctionType func{std::get<2>(prod)};\n"
-            "\t\t\t\tfunc(this->sym_stack);\n"
-            "\t\t\t}\n"
-            "\t\t// Accept action. This ends the parsing process successfully.\n"
-            "\t\t} else if (action.first == 'a') {\n"
-            "\t\t\treturn true;\n"
-            "\t\t// Error action. This ends the parsing process unsuccessfully.\n"
-            "\t\t} else {\n"
-            "\t\t\treturn false;\n"
-            "\t\t}\n"
+            "\n\t\t};\n"
+            "\t\tgoto *targets[top];\n"
             "\t}\n"
-            "}\n"
+            "#else\n"
+            "\tswitch (top) {\n"
         ])
+        for i in range(num_states):
+            if targets[i] is not None:
+                body.write("\tcase " + str(i) + ": goto state_" + str(targets[i]) + ";\n")
+        body.writelines([
+            "\tdefault: goto parse_error;\n"
+            "\t}\n"
+            "#endif\n\n"
+        ])
+
+    body.writelines([
+        "token_error:\n"
+        "\t// Wait for the next token to be pushed.\n"
+        "\tif (Input::may_run_out && input.token_type() < 0)\n"
+        "\t\treturn PushResult::NEED_MORE;\n"
+        "parse_error:\n"
+        "\treturn PushResult::ERROR;\n"
+        "}\n"
+    ])
+    emit_entry_points(lexeme_views, False, parse_many, syntax_tree, body)
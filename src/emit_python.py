@@ -0,0 +1,154 @@
+# emit the parser as a self-contained python module (my_little_parser.py), for tools which parse in the same process
+#
+# the dense tables are flattened into arrays of integers, with the actions encoded as in the c++ parsers
+# the user defined code of the grammar is c++, so it is left out, and the values are computed by python callables
+# given to the parser, one for each production
+import io
+from emit_parser import production_arrays, production_to_string, write_file
+
+
+# the parser class of the module, which is the same for every grammar
+# the parsing loop keeps everything it uses in local variables, and allocates nothing of its own on a shift, or on a
+# reduction by a production with a body of up to three symbols
+PARSER_CODE = '''
+# Thrown when the input is not a sentence of the grammar.
+class ParseError(Exception):
+    def __init__(self, position, token_type, state):
+        self.position = position
+        self.token_type = token_type
+        self.state = state
+        super().__init__("unexpected token of type " + str(token_type) + " at position " + str(position))
+
+
+class Parser:
+    # actions maps the productions (written as in PRODUCTIONS) to the callables which compute the values of their
+    # heads from the values of their body symbols, the lexemes of the terminals being the values of the terminals.
+    # Productions without a callable take the value of their first body symbol, or None if their body is empty.
+    def __init__(self, actions=None):
+        actions = dict(actions or {})
+        unknown = [production for production in actions if production not in PRODUCTIONS]
+        if len(unknown) > 0:
+            raise ValueError("Not productions of the grammar: " + ', '.join(unknown))
+        self.actions = tuple(actions.get(production) for production in PRODUCTIONS)
+
+    # Parse an iterable of (token type, lexeme) pairs, and return the value of the start symbol. The end of the
+    # input is marked by the end of the iterable. A token type which is not in TOKEN_TYPES raises ParseError.
+    def parse(self, tokens):
+        action_table = _ACTIONS
+        goto_table = _GOTOS
+        heads = _HEADS
+        lengths = _LENGTHS
+        callables = self.actions
+        num_terminals = _NUM_TERMINALS
+        num_nonterminals = _NUM_NONTERMINALS
+        accept = _ACCEPT
+        end = (END_OF_INPUT, None)
+
+        states = [0]
+        values = []
+        push_state = states.append
+        push_value = values.append
+        tokens = iter(tokens)
+        state = 0
+        position = 0
+        (token_type, lexeme) = next(tokens, end)
+        if not 0 <= token_type < num_terminals:
+            raise ParseError(position, token_type, state)
+
+        while True:
+            action = action_table[state * num_terminals + token_type]
+            if action > 0:
+                state = action
+                push_state(state)
+                push_value(lexeme)
+                position += 1
+                (token_type, lexeme) = next(tokens, end)
+                if not 0 <= token_type < num_terminals:
+                    raise ParseError(position, token_type, state)
+            elif action < 0:
+                if action == accept:
+                    return values[-1]
+
+                production = -action - 1
+                length = lengths[production]
+                function = callables[production]
+                if function is None:
+                    if length == 0:
+                        push_value(None)
+                    elif length > 1:
+                        del values[1 - length:]
+                elif length == 1:
+                    values[-1] = function(values[-1])
+                elif length == 3:
+                    values[-3] = function(values[-3], values[-2], values[-1])
+                    del values[-2:]
+                elif length == 2:
+                    values[-2] = function(values[-2], values[-1])
+                    del values[-1]
+                elif length == 0:
+                    push_value(function())
+                else:
+                    values[-length] = function(*values[-length:])
+                    del values[1 - length:]
+
+                del states[len(states) - length:]
+                state = goto_table[states[-1] * num_nonterminals + heads[production]]
+                push_state(state)
+            else:
+                raise ParseError(position, token_type, state)
+'''
+
+
+# smallest typecode of the array module which can hold all the values between low and high
+def array_typecode(low, high):
+    for (typecode, bits) in [('b', 8), ('h', 16), ('i', 32)]:
+        if low >= -(1 << (bits - 1)) and high < 1 << (bits - 1):
+            return typecode
+
+    return 'q'
+
+
+# emit a flat array of integers, with a given number of values per line
+def emit_python_array(name, values, module, per_line=16):
+    module.write(name + " = array('" + array_typecode(min(values), max(values)) + "', (")
+    for i in range(len(values)):
+        if i % per_line == 0:
+            module.write("\n    ")
+        module.write(str(values[i]) + ", ")
+    module.write("\n))\n")
+
+
+# write the module with the token types, the productions, the tables and the parser
+def create_python_module(action_table, goto_table, productions, tables):
+    terminals = action_table[0]
+    [heads, lengths] = production_arrays(goto_table, productions)[0:2]
+
+    with io.StringIO() as module:
+        module.write("# Generated by the parser generator, do not edit.\n"
+                     "from array import array\n\n"
+                     "# Types of the tokens, numbered as the columns of the ACTION table. The last one marks the end "
+                     "of the input.\n"
+                     "TOKEN_TYPES = {\n")
+        for i in range(len(terminals)):
+            module.write("    " + repr(terminals[i]) + ": " + str(i) + ",\n")
+        module.write("}\n"
+                     "END_OF_INPUT = " + str(len(terminals) - 1) + "\n\n"
+                     "# Productions, in the order of their numbers.\n"
+                     "PRODUCTIONS = (\n")
+        for production in productions:
+            module.write("    " + repr(production_to_string(production)) + ",\n")
+        module.write(")\n\n"
+                     "_NUM_TERMINALS = " + str(len(terminals)) + "\n"
+                     "_NUM_NONTERMINALS = " + str(len(goto_table[0])) + "\n"
+                     "_ACCEPT = " + str(tables.accept) + "\n\n"
+                     "# ACTION table, one row after another. n > 0 shifts to state n, -p - 1 reduces by production p, "
+                     "and 0 is an error.\n")
+        emit_python_array("_ACTIONS", [action for row in tables.actions for action in row], module)
+        module.write("\n# GOTO table, one row after another.\n")
+        emit_python_array("_GOTOS", [target for row in tables.gotos for target in row], module)
+        module.write("\n# Heads (numbered as the columns of the GOTO table) and body lengths of the productions.\n")
+        emit_python_array("_HEADS", heads, module)
+        emit_python_array("_LENGTHS", lengths, module)
+        module.write("\n" + PARSER_CODE)
+
+        write_file("my_little_parser.py", module.getvalue())
@@ -13,69 +13,117 @@ class FirstFollowError(Exception):
         return self.message
 
 
+# nullability and FIRST sets of every grammar symbol, computed once per grammar
+# symbols are referred to by their integer ids (see grammar.py)
+# FIRST sets are stored as bitsets (python integers), where bit i stands for the terminal with id i
+# epsilon does not get its own bit, it is tracked by the nullable flags instead
+class FirstSets:
+    def __init__(self, grammar):
+        self.grammar = grammar
+
+        # FIRST set of a terminal is the terminal itself
+        self.first = [0 for sym in grammar.symbols]
+        self.nullable = [False for sym in grammar.symbols]
+        for sym in range(grammar.num_terminals):
+            self.first[sym] = 1 << sym
+
+        # grow the FIRST sets and the nullable flags until nothing changes
+        # this terminates on left recursive grammars as well, since each pass can only add bits
+        has_changed = True
+        while has_changed:
+            has_changed = False
+            for production in range(len(grammar.bodies)):
+                head = grammar.heads[production]
+                (bits, nullable) = self.first_bits(grammar.bodies[production])
+                if bits & ~self.first[head]:
+                    self.first[head] |= bits
+                    has_changed = True
+                if nullable and not self.nullable[head]:
+                    self.nullable[head] = True
+                    has_changed = True
+
+        # for every item core, FIRST set of the rest of the body which follows the symbol in front of the dot
+        self.tail_first = []
+        self.tail_nullable = []
+        for core in range(len(grammar.core_production)):
+            body = grammar.bodies[grammar.core_production[core]]
+            (bits, nullable) = self.first_bits(body[grammar.core_dot[core] + 1:len(body)])
+            self.tail_first.append(bits)
+            self.tail_nullable.append(nullable)
+
+    # given a string of symbol ids, compute the FIRST set of the string as a bitset
+    # also tell whether the whole string can derive epsilon
+    def first_bits(self, symbols):
+        bits = 0
+        for symbol in symbols:
+            bits |= self.first[symbol]
+            if not self.nullable[symbol]:
+                return bits, False
+
+        return bits, True
+
+    # list the ids of the terminals contained in a bitset
+    def terminals_of(self, bits):
+        syms = []
+        while bits:
+            low_bit = bits & -bits
+            syms.append(low_bit.bit_length() - 1)
+            bits ^= low_bit
+
+        return syms
+
+
 # given a string of symbols, computes the FIRST set of the string
-def first_syms(symbols, terminals):
-    seen_eps = True
-    tmp_set = set()
-    for symbol in symbols:
-        if not seen_eps:
-            break
-
-        tmp_set |= first(symbol, terminals)
-        if terminals["eps"] in tmp_set:
-            tmp_set.remove(terminals["eps"])
-        else:
-            seen_eps = False
+def first_syms(symbols, first_sets):
+    grammar = first_sets.grammar
+    (bits, nullable) = first_sets.first_bits([sym.id for sym in symbols if sym != grammar.eps])
+    sym_set = {grammar.symbols[sym] for sym in first_sets.terminals_of(bits)}
 
     # if there is an epsilon in FIRST set of every symbol, add epsilon to the FIRST set of the string
-    if seen_eps:
-        tmp_set.add(terminals["eps"])
+    if nullable:
+        sym_set.add(grammar.eps)
 
-    return tmp_set
+    return sym_set
 
 
-# helper function which iterates over productions for a nonterminal symbol
-def first(symbol, terminals):
-    if symbol.is_terminal:
-        return {symbol}
+# computes the FIRST set of a single grammar symbol
+def first(symbol, first_sets):
+    return first_syms([symbol], first_sets)
 
-    sym_set = set()
-    for production in symbol.productions:
-        # if this is an empty production, add the epsilon terminal to the FIRST set
-        if production[0].name == "eps":
-            sym_set.add(terminals["eps"])
-            continue
 
-        sym_set |= first_syms(production, terminals)
+# compute FOLLOW sets of all nonterminals of the (augmented) grammar, as bitsets indexed by symbol ids
+# FOLLOW sets are grown with a fixed-point pass over all productions, instead of following the productions recursively
+def create_follow_sets(grammar):
+    first_sets = grammar.first_sets
+    follow_sets = [0 for sym in grammar.symbols]
+    follow_sets[grammar.start_symbol] = 1 << grammar.end
 
-    return sym_set
+    has_changed = True
+    while has_changed:
+        has_changed = False
+        for production in range(len(grammar.bodies)):
+            head = grammar.heads[production]
+            body = grammar.bodies[production]
+            for i in range(len(body)):
+                if grammar.is_terminal(body[i]):
+                    continue
 
+                # FIRST set of the rest of the production, and FOLLOW set of the head if the rest can produce epsilon
+                core = grammar.first_core[production] + i
+                bits = first_sets.tail_first[core]
+                if first_sets.tail_nullable[core]:
+                    bits |= follow_sets[head]
+                if bits & ~follow_sets[body[i]]:
+                    follow_sets[body[i]] |= bits
+                    has_changed = True
+
+    return follow_sets
 
-# given a nonterminal symbol, compute its FOLLOW set
-def follow(symbol, terminals, nonterminals):
-    sym_set = set()
 
+# given a nonterminal symbol, compute its FOLLOW set
+def follow(symbol, grammar):
     if symbol.is_terminal:
         raise FirstFollowError("FOLLOW sets can be calculated for nonterminal symbols only!")
 
-    if symbol.is_start:
-        sym_set.add(terminals['$'])
-
-    for nonterminal in nonterminals:
-        for production in nonterminals[nonterminal].productions:
-            # symbol is at the end of a production
-            if symbol in production and production[-1] == symbol:
-                if nonterminals[nonterminal] != symbol:
-                    sym_set |= follow(nonterminals[nonterminal], terminals, nonterminals)
-            # symbol is in the middle of a production
-            elif symbol in production:
-                # compute FIRST set of the rest of the production
-                first_set = first_syms(production[production.index(symbol) + 1:len(production)], terminals)
-                # rest of the production can produce epsilon
-                if terminals['eps'] in first_set:
-                    first_set.remove(terminals['eps'])
-                    if nonterminals[nonterminal] != symbol:
-                        sym_set |= follow(nonterminals[nonterminal], terminals, nonterminals)
-                sym_set |= first_set
-
-    return sym_set
+    bits = create_follow_sets(grammar)[symbol.id]
+    return {grammar.symbols[sym] for sym in grammar.first_sets.terminals_of(bits)}
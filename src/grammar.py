@@ -0,0 +1,102 @@
+from first_follow import FirstSets
+from process_production import Terminal
+
+
+# integer representation of the (augmented) grammar, used while building the LR(1) automaton and its tables
+#
+# every grammar symbol is interned to a dense integer id
+# terminals come first, in the order of the _tokens section, so the id of a terminal is also its ACTION table column
+# nonterminals follow in the order of their appearance, the augmented starting symbol being the last one
+# epsilon does not get an id, empty productions simply have empty bodies
+#
+# productions are numbered in the order of their heads, which is the same numbering the generated parser uses
+# the production of the augmented starting symbol comes last
+class Grammar:
+    def __init__(self, terminals, nonterminals, terminals_list):
+        self.eps = terminals["eps"]
+
+        # intern the terminals (tokens which are not used by any production still get their own ACTION table column)
+        self.symbols = []
+        for name in terminals_list:
+            if name in terminals:
+                self.symbols.append(terminals[name])
+            else:
+                self.symbols.append(Terminal(name))
+        self.num_terminals = len(self.symbols)
+
+        # intern the nonterminals
+        for name in nonterminals:
+            self.symbols.append(nonterminals[name])
+            if name == "__start":
+                self.start_symbol = len(self.symbols) - 1
+
+        for i in range(len(self.symbols)):
+            self.symbols[i].id = i
+
+        self.end = terminals['$'].id
+
+        # number the productions
+        # each production is kept both in its original form (head object, list of body symbols),
+        # and as a pair of a head id and a tuple of body ids
+        self.productions = []
+        self.heads = []
+        self.bodies = []
+        self.productions_of = [[] for sym in self.symbols]
+        for name in nonterminals:
+            nonterminal = nonterminals[name]
+            for production in nonterminal.productions:
+                self.productions_of[nonterminal.id].append(len(self.productions))
+                self.productions.append((nonterminal, production))
+                self.heads.append(nonterminal.id)
+                self.bodies.append(tuple(sym.id for sym in production if sym != self.eps))
+        self.start_production = self.productions_of[self.start_symbol][0]
+
+        # number the cores of LR(1) items, that is, pairs of a production and a position of the dot in its body
+        # cores of one production are numbered consecutively, so moving the dot over one symbol increments the core id
+        # for each core keep its production, dot position and the symbol in front of the dot (None if there is none)
+        self.first_core = []
+        self.core_production = []
+        self.core_dot = []
+        self.core_symbol = []
+        for production in range(len(self.bodies)):
+            body = self.bodies[production]
+            self.first_core.append(len(self.core_production))
+            for dot in range(len(body) + 1):
+                self.core_production.append(production)
+                self.core_dot.append(dot)
+                self.core_symbol.append(body[dot] if dot < len(body) else None)
+
+        self.first_sets = FirstSets(self)
+
+    # whether the given symbol id stands for a terminal
+    def is_terminal(self, sym):
+        return sym < self.num_terminals
+
+    # name of the symbol with the given id
+    def name(self, sym):
+        return self.symbols[sym].name
+
+    # render a production
+    def production_to_string(self, production):
+        body = [self.name(sym) for sym in self.bodies[production]]
+        if len(body) == 0:
+            body = ["Eps"]
+
+        return self.name(self.heads[production]) + " -> " + ' '.join(body)
+
+    # render an item core, along with its lookahead bitset if there is one
+    def core_to_string(self, core, lookaheads=None):
+        production = self.core_production[core]
+        body = self.bodies[production]
+        ret = '[' + self.name(self.heads[production]) + " -> "
+        for i in range(0, len(body)):
+            if i == self.core_dot[core]:
+                ret += "* "
+            ret += self.name(body[i]) + ' '
+        if self.core_dot[core] == len(body):
+            ret += "* "
+        if lookaheads is not None:
+            ret += ", " + '/'.join(self.name(sym) for sym in self.first_sets.terminals_of(lookaheads))
+        ret += ']'
+
+        return ret
@@ -0,0 +1,178 @@
+# parse with an LR(1) automaton which is built while parsing, instead of all at once by create_collection()
+#
+# a state is identified by its kernel, just like in create_collection(), and it is only closed when parsing first
+# reaches it
+# its ACTION entries and GOTO transitions are computed one symbol at a time, when the parser first needs them, and they
+# are kept in the state, so the parts of the grammar which the inputs do not use are never looked at
+# nonterminals are closed with templates, like in create_collection(), but the template of a nonterminal is only
+# created when a state first needs it
+# conflicts are found the same way, so a grammar which is not LR(1) is only reported once an input runs into a conflict
+#
+# the states are memoized in a table which grows as they are built
+# if the number of states is capped, the least recently used ones are evicted from the table, and built again if
+# they are needed later (the states on the stack of a running parse are kept by the stack, so they stay usable)
+import collections
+from emit_parser import production_to_string
+from grammar import Grammar
+from lr1_collection import augment_grammar, closure, ItemTables
+from lr1_tables import describe_action, ConflictError
+from parse_input_file import read_input_file
+from process_production import remove_useless_symbols
+
+
+# throw this if the input is not a sentence of the grammar
+class UnexpectedTokenError(Exception):
+    def __init__(self, position, token_type, state):
+        self.position = position
+        self.token_type = token_type
+        self.state = state
+        self.message = "Unexpected token of type " + str(token_type) + " at position " + str(position)
+
+    def __str__(self):
+        return self.message
+
+
+# one state of the automaton, along with the ACTION entries and GOTO transitions which have been computed so far
+# shifts and transitions lead to the kernels of the target states, which are looked up in the table when taken
+class LazyState:
+    def __init__(self, number, items):
+        self.number = number
+        self.items = items
+        self.actions = dict()
+        self.gotos = dict()
+
+
+# read the grammar from an .mlg file, ready to be parsed with
+def load_grammar(filename):
+    (manifest_code, types, terminals, nonterminals, terminals_list) = read_input_file(filename)
+    remove_useless_symbols(nonterminals)
+    augment_grammar(nonterminals)
+
+    return Grammar(terminals, nonterminals, terminals_list)
+
+
+class LazyParser:
+    # actions maps the productions (e.g. 'e -> e PLUS t') to python callables, like in the module generated with
+    # '--backend python'
+    # if max_states is given, no more than that many states are kept in the table
+    def __init__(self, grammar, actions=None, max_states=None):
+        if max_states is not None and max_states < 1:
+            raise ValueError("At least one state has to be kept")
+
+        self.grammar = grammar
+        self.tables = ItemTables(grammar, lazy=True)
+        self.max_states = max_states
+        self.token_types = {grammar.name(sym): sym for sym in range(grammar.num_terminals)}
+
+        names = [production_to_string(production) for production in grammar.productions]
+        actions = dict(actions or {})
+        unknown = [name for name in actions if name not in names]
+        if len(unknown) > 0:
+            raise ValueError("Not productions of the grammar: " + ', '.join(unknown))
+        self.callables = [actions.get(name) for name in names]
+        self.lengths = [len(body) for body in grammar.bodies]
+
+        # states by their kernels, from the least to the most recently used one
+        self.states = collections.OrderedDict()
+        self.start = frozenset({(grammar.first_core[grammar.start_production], 1 << grammar.end)})
+        # number of states built so far (a state which was evicted and built again counts twice), and evicted
+        self.num_built = 0
+        self.num_evicted = 0
+
+    # find the state with the given kernel, building it if it is not in the table
+    def state(self, kernel):
+        state = self.states.get(kernel)
+        if state is not None:
+            self.states.move_to_end(kernel)
+            return state
+
+        state = LazyState(self.num_built, closure(dict(kernel), self.tables))
+        self.num_built += 1
+        self.states[kernel] = state
+        if self.max_states is not None and len(self.states) > self.max_states:
+            self.states.popitem(last=False)
+            self.num_evicted += 1
+
+        return state
+
+    # kernel of the state which the state goes to on the symbol, or None if there is no such state
+    def goto_kernel(self, state, sym):
+        kernel = frozenset((core + 1, lookaheads) for (core, lookaheads) in state.items.items()
+                           if self.tables.core_symbol[core] == sym)
+
+        return kernel if len(kernel) > 0 else None
+
+    # compute the ACTION entry of the state for the terminal, as create_tables() would
+    # shifts are ('s', kernel of the target state), and errors are None
+    def add_action(self, state, sym):
+        grammar = self.grammar
+        actions = []
+        kernel = self.goto_kernel(state, sym)
+        if kernel is not None:
+            actions.append(('s', kernel))
+        for (core, lookaheads) in state.items.items():
+            if grammar.core_symbol[core] is None and lookaheads >> sym & 1:
+                production = grammar.core_production[core]
+                action = 'a' if production == grammar.start_production and sym == grammar.end else ('r', production)
+                if action not in actions:
+                    actions.append(action)
+
+        if len(actions) > 1:
+            described = [describe_action(('s', self.state(action[1]).number) if action[0] == 's' else action, grammar)
+                         for action in actions]
+            raise ConflictError("Grammar is not LR(1)! Conflict in state " + str(state.number) + " on "
+                                + grammar.name(sym) + ": " + " or ".join(described))
+
+        action = actions[0] if len(actions) > 0 else None
+        state.actions[sym] = action
+        return action
+
+    # parse an iterable of (token type, lexeme) pairs, and return the value of the start symbol
+    # token types are the ids of the terminals (see token_types), and the end of the input is the end of the iterable
+    def parse(self, tokens):
+        grammar = self.grammar
+        callables = self.callables
+        lengths = self.lengths
+        end = (grammar.end, None)
+
+        states = [self.state(self.start)]
+        values = []
+        tokens = iter(tokens)
+        position = 0
+        (token_type, lexeme) = next(tokens, end)
+
+        while True:
+            state = states[-1]
+            action = state.actions[token_type] if token_type in state.actions else self.add_action(state, token_type)
+            if action is None:
+                raise UnexpectedTokenError(position, token_type, state.number)
+            elif action == 'a':
+                return values[-1]
+            elif action[0] == 's':
+                states.append(self.state(action[1]))
+                values.append(lexeme)
+                position += 1
+                (token_type, lexeme) = next(tokens, end)
+                continue
+
+            # reduce, leaving the value of the head in the place of the first body symbol
+            production = action[1]
+            length = lengths[production]
+            function = callables[production]
+            if function is None:
+                if length == 0:
+                    values.append(None)
+                elif length > 1:
+                    del values[1 - length:]
+            elif length == 0:
+                values.append(function())
+            else:
+                values[-length] = function(*values[-length:])
+                del values[len(values) - length + 1:]
+
+            del states[len(states) - length:]
+            top = states[-1]
+            head = grammar.heads[production]
+            if head not in top.gotos:
+                top.gotos[head] = self.goto_kernel(top, head)
+            states.append(self.state(top.gotos[head]))
@@ -0,0 +1,149 @@
+from first_follow import create_follow_sets
+from lr1_collection import create_collection
+
+
+# this creates the collection of sets of LR(0) items and computes lookaheads of its reduce items, which gives
+# the SLR(1) and LALR(1) automata
+# both of them have far fewer states than the canonical LR(1) automaton, since states are never split by lookaheads
+# the returned collection has the same form as the one created by lr1_collection.create_collection, only the
+# lookahead bitsets of the items which are not reduce items are left empty
+#
+# SLR(1) lookaheads of a reduce item are simply the FOLLOW set of the head of its production [1]
+# LALR(1) lookaheads are computed with lookahead relations over nonterminal transitions of the LR(0) automaton [2]
+#
+# [1] The Dragon Book, 2nd Ed, p. 252
+# [2] DeRemer, F. & Pennello, T. (1982). Efficient Computation of LALR(1) Look-Ahead Sets.
+#     ACM Transactions on Programming Languages and Systems, 4(4), 615-649.
+
+
+# compute the least sets F(x) such that F(x) contains initial(x) and F(y) for every edge x -> y
+# this is the 'digraph' algorithm from [2], which collapses strongly connected components of the relation
+# the recursive traversal is unrolled into an explicit stack, since the relations can get deep on big grammars
+def digraph(edges, initial):
+    result = list(initial)
+    finished = len(initial) + 1
+    depth = [0 for x in initial]
+    stack = []
+
+    for start in range(len(initial)):
+        if depth[start] != 0:
+            continue
+
+        stack.append(start)
+        depth[start] = len(stack)
+        # every frame holds a node, its depth when it was pushed and the index of the next edge to follow
+        path = [[start, len(stack), 0]]
+        while path:
+            frame = path[-1]
+            x = frame[0]
+            if frame[2] < len(edges[x]):
+                y = edges[x][frame[2]]
+                frame[2] += 1
+                if depth[y] == 0:
+                    stack.append(y)
+                    depth[y] = len(stack)
+                    path.append([y, len(stack), 0])
+                    continue
+                depth[x] = min(depth[x], depth[y])
+                result[x] |= result[y]
+                continue
+
+            # all edges of x are followed, if x is the root of a strongly connected component, pop the component
+            path.pop()
+            if depth[x] == frame[1]:
+                while True:
+                    y = stack.pop()
+                    depth[y] = finished
+                    result[y] = result[x]
+                    if y == x:
+                        break
+
+            # propagate the result back to the node from which x was reached
+            if path:
+                parent = path[-1][0]
+                depth[parent] = min(depth[parent], depth[x])
+                result[parent] |= result[x]
+
+    return result
+
+
+# create the SLR(1) automaton, reduce items get FOLLOW sets of their heads as lookaheads
+def create_slr_collection(grammar, jobs=1):
+    (collection, transitions) = create_collection(grammar, lr0=True, jobs=jobs)
+    follow_sets = create_follow_sets(grammar)
+
+    for item_set in collection:
+        for core in item_set:
+            if grammar.core_symbol[core] is None:
+                item_set[core] = follow_sets[grammar.heads[grammar.core_production[core]]]
+
+    return collection, transitions
+
+
+# create the LALR(1) automaton, using the DeRemer-Pennello lookahead relations
+def create_lalr_collection(grammar, jobs=1):
+    (collection, transitions) = create_collection(grammar, lr0=True, jobs=jobs)
+    nullable = grammar.first_sets.nullable
+
+    # number all nonterminal transitions (p, A) of the LR(0) automaton
+    nonterminal_transitions = []
+    transition_index = dict()
+    for p in range(len(collection)):
+        for sym in sorted(transitions[p]):
+            if not grammar.is_terminal(sym):
+                transition_index[(p, sym)] = len(nonterminal_transitions)
+                nonterminal_transitions.append((p, sym))
+
+    # DR(p, A) are the terminals which can be shifted right after the transition (p, A)
+    # (p, A) reads (r, C) if r is the target of (p, A) and C is a nullable nonterminal with a transition from r
+    # the accepting item acts as if the end of input could be shifted after the original starting symbol
+    accepting_core = grammar.first_core[grammar.start_production] + 1
+    direct_reads = []
+    reads = []
+    for (p, sym) in nonterminal_transitions:
+        r = transitions[p][sym]
+        bits = 0
+        edges = []
+        for next_sym in sorted(transitions[r]):
+            if grammar.is_terminal(next_sym):
+                bits |= 1 << next_sym
+            elif nullable[next_sym]:
+                edges.append(transition_index[(r, next_sym)])
+        if accepting_core in collection[r]:
+            bits |= 1 << grammar.end
+        direct_reads.append(bits)
+        reads.append(edges)
+
+    read_sets = digraph(reads, direct_reads)
+
+    # (p, A) includes (p', B) if B -> w A v, v is nullable and p' reaches p by reading w
+    # reduce item of B -> w in state q looks back at (p', B) if p' reaches q by reading w
+    includes = [[] for x in nonterminal_transitions]
+    lookback = dict()
+    for j in range(len(nonterminal_transitions)):
+        (p, sym) = nonterminal_transitions[j]
+        for production in grammar.productions_of[sym]:
+            state = p
+            core = grammar.first_core[production]
+            for body_sym in grammar.bodies[production]:
+                if not grammar.is_terminal(body_sym) and grammar.first_sets.tail_nullable[core]:
+                    includes[transition_index[(state, body_sym)]].append(j)
+                state = transitions[state][body_sym]
+                core += 1
+            if (state, core) not in lookback:
+                lookback[(state, core)] = []
+            lookback[(state, core)].append(j)
+
+    follow_sets = digraph(includes, read_sets)
+
+    # lookaheads of a reduce item are the union of FOLLOW sets of the transitions it looks back at
+    # the accepting item [__start -> old_start * , $] does not look back at anything, its only lookahead is known
+    for q in range(len(collection)):
+        for core in collection[q]:
+            if core == accepting_core:
+                collection[q][core] = 1 << grammar.end
+            elif grammar.core_symbol[core] is None:
+                for j in lookback.get((q, core), []):
+                    collection[q][core] |= follow_sets[j]
+
+    return collection, transitions
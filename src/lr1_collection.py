@@ -1,43 +1,14 @@
+from multiprocessing import Pool
 from process_production import Nonterminal
-from first_follow import first_syms
 
 
 # this creates a collection of sets of LR(1) items as described by the algorithms in [1]
+# sets of LR(1) items are represented as dictionaries which map item cores (see grammar.py) to lookahead bitsets
+# all the items which share a core are merged into one entry, so an item with many lookaheads is processed only once
 #
 # [1] The Dragon Book, 2nd Ed, p. 261
 
 
-# represents one LR(1) item
-# LR(1) is defined by a production of a nonterminal, position of the dot, and lookahead symbol
-class Item:
-    def __init__(self, nonterminal, production, dot, lookahead):
-        self.nonterminal = nonterminal
-        self.production = production
-        self.dot = dot
-        self.lookahead = lookahead
-
-    def __hash__(self):
-        return hash(str(self))
-
-    def __eq__(self, other):
-        return self.nonterminal == other.nonterminal \
-               and self.production == other.production \
-               and self.dot == other.dot \
-               and self.lookahead == other.lookahead
-
-    def __str__(self):
-        ret = '[' + str(self.nonterminal) + " -> "
-        for i in range(0, len(self.production)):
-            if i == self.dot:
-                ret += "* "
-            ret += str(self.production[i]) + ' '
-        if self.dot == len(self.production):
-            ret += "* "
-        ret += ", " + str(self.lookahead) + ']'
-
-        return ret
-
-
 # augment the described grammar by adding a 'false' starting symbol and its production which derives the original
 # starting symbol
 def augment_grammar(nonterminals):
@@ -54,97 +25,231 @@ def augment_grammar(nonterminals):
     nonterminals["__start"] = new_start_sym
 
 
+# precompute the closure of a nonterminal
+# closing a nonterminal A means adding the items [A -> * w] for all productions of A, and so on, so the cores of the
+# added items depend on A only
+# lookaheads of the added items come either from FIRST sets of the rest of the bodies in which the nonterminals appear
+# (spontaneous lookaheads), or from the lookaheads with which A itself was brought in (inherited lookaheads)
+# all the productions of a nonterminal get the same lookaheads, so they are propagated from nonterminal to nonterminal
+# return a list of (core, spontaneous lookahead bitset, whether lookaheads are inherited) triples
+def create_closure_template(grammar, nonterminal):
+    first_sets = grammar.first_sets
+    spontaneous = {nonterminal: 0}
+    inherited = {nonterminal}
+    # a nonterminal waits in the list at most once, and it passes on all the lookaheads it got in the meantime
+    unprocessed_symbols = [nonterminal]
+    waiting = {nonterminal}
+
+    # propagate both kinds of lookaheads, until nothing changes
+    while unprocessed_symbols:
+        head = unprocessed_symbols.pop()
+        waiting.remove(head)
+        for production in grammar.productions_of[head]:
+            core = grammar.first_core[production]
+            sym = grammar.core_symbol[core]
+            if sym is None or grammar.is_terminal(sym):
+                continue
+
+            lookaheads = first_sets.tail_first[core]
+            inherits = False
+            if first_sets.tail_nullable[core]:
+                lookaheads |= spontaneous[head]
+                inherits = head in inherited
+            old_lookaheads = spontaneous.get(sym, 0)
+            if sym not in spontaneous or lookaheads & ~old_lookaheads or (inherits and sym not in inherited):
+                spontaneous[sym] = old_lookaheads | lookaheads
+                if inherits:
+                    inherited.add(sym)
+                if sym not in waiting:
+                    waiting.add(sym)
+                    unprocessed_symbols.append(sym)
+
+    return sorted((grammar.first_core[production], spontaneous[sym], sym in inherited)
+                  for sym in spontaneous for production in grammar.productions_of[sym])
+
+
+# precompute the closure templates of all the nonterminals, once per grammar
+# the list of templates is indexed by symbol ids, and the templates of terminals are empty
+def create_closure_templates(grammar):
+    return [create_closure_template(grammar, sym) if not grammar.is_terminal(sym) else []
+            for sym in range(len(grammar.symbols))]
+
+
+# closure templates which are only created for the nonterminals which are actually closed, when they are first closed
+# they are indexed just like the list returned by create_closure_templates(), for parsers which build only the states
+# their inputs reach
+class LazyClosureTemplates:
+    def __init__(self, grammar):
+        self.grammar = grammar
+        self.templates = [[] if grammar.is_terminal(sym) else None for sym in range(len(grammar.symbols))]
+
+    def __getitem__(self, sym):
+        template = self.templates[sym]
+        if template is None:
+            template = create_closure_template(self.grammar, sym)
+            self.templates[sym] = template
+
+        return template
+
+
+# integer arrays of the grammar which are needed to close sets of items and to compute their GOTO kernels
+# these are all that worker processes need while the collection is built, so only they are shipped to the workers,
+# once per worker, instead of the whole grammar with all of its symbol objects
+# if lazy is set, the closure templates are only created as the nonterminals are closed (and the tables can not be
+# shipped to the workers, as they keep the grammar)
+class ItemTables:
+    def __init__(self, grammar, lazy=False):
+        self.num_terminals = grammar.num_terminals
+        self.core_symbol = grammar.core_symbol
+        self.tail_first = grammar.first_sets.tail_first
+        self.tail_nullable = grammar.first_sets.tail_nullable
+        if lazy:
+            self.closure_templates = LazyClosureTemplates(grammar)
+        else:
+            self.closure_templates = create_closure_templates(grammar)
+
+
 # implement the CLOSURE function
-def closure(items, terminals):
-    has_unprocessed_items = True
-    new_items = set()
-    # loop until there are no new items
-    while has_unprocessed_items:
-        has_unprocessed_items = False
-        for item in items:
-            # dot is not at the end of the production and dot is in front of a nonterminal
-            if item.dot < len(item.production) and not item.production[item.dot].is_terminal:
-                # for all productions of the said nonterminal...
-                for production in item.production[item.dot].productions:
-                    # compute FIRST set of the rest of the production, combined with the lookahead symbol
-                    for sym in first_syms(item.production[item.dot + 1:len(item.production)]
-                                          + [item.lookahead], terminals):
-                        # we only want terminals
-                        if sym.is_terminal:
-                            set_size = len(new_items)
-                            new_items.add(Item(item.production[item.dot], production, 0, sym))
-                            # check whether the item was actually added to the set
-                            if len(new_items) != set_size:
-                                has_unprocessed_items = True
-        items |= new_items
-
-    return items
+# instead of looping until no new items are found, instantiate the closure template of every nonterminal which
+# appears in front of the dot, with the lookaheads that the kernel item passes to it
+def closure(items, tables):
+    closed_items = dict(items)
+    for core in items:
+        sym = tables.core_symbol[core]
+        # dot is not at the end of the production and dot is in front of a nonterminal
+        if sym is not None and sym >= tables.num_terminals:
+            # compute FIRST set of the rest of the production, combined with the lookahead symbols
+            lookaheads = tables.tail_first[core]
+            if tables.tail_nullable[core]:
+                lookaheads |= items[core]
+            for (new_core, spontaneous, inherits) in tables.closure_templates[sym]:
+                if inherits:
+                    closed_items[new_core] = closed_items.get(new_core, 0) | spontaneous | lookaheads
+                else:
+                    closed_items[new_core] = closed_items.get(new_core, 0) | spontaneous
+
+    return closed_items
+
+
+# implement the CLOSURE function for sets of LR(0) items
+# items have no lookaheads, so only the cores of the closure templates are added
+def closure_lr0(items, tables):
+    closed_items = dict(items)
+    for core in items:
+        sym = tables.core_symbol[core]
+        # dot is not at the end of the production and dot is in front of a nonterminal
+        if sym is not None and sym >= tables.num_terminals:
+            for (new_core, spontaneous, inherits) in tables.closure_templates[sym]:
+                closed_items[new_core] = 0
+
+    return closed_items
 
 
 # implement the GOTO function
-def goto(items, symbol, terminals):
-    j = set()
-    for item in items:
-        # dot is not at the end of the production and dot is in front of a nonterminal
-        if item.dot < len(item.production) and item.production[item.dot] == symbol:
-            if item.dot == 0 and item.production[0].name == "eps":
-                continue
-            j.add(Item(item.nonterminal, item.production, item.dot + 1, item.lookahead))
+def goto(items, symbol, tables):
+    j = dict()
+    for core in items:
+        # dot is in front of the given symbol
+        if tables.core_symbol[core] == symbol:
+            j[core + 1] = items[core]
 
-    return closure(j, terminals)
+    return closure(j, tables)
+
+
+# compute kernels of GOTO sets of the given set of items for all grammar symbols at once
+# return a dictionary which maps symbol ids to the kernels, kernels are not closed
+def goto_kernels(items, tables):
+    kernels = dict()
+    for core in items:
+        sym = tables.core_symbol[core]
+        # dot is not at the end of the production, so the item moves over the symbol in front of the dot
+        if sym is not None:
+            if sym not in kernels:
+                kernels[sym] = dict()
+            kernels[sym][core + 1] = items[core]
+
+    return kernels
+
+
+# close the kernel of a state and compute the kernels of all of its GOTO sets
+# return the closed set of items, and (symbol id, kernel) pairs ordered by symbol ids
+def expand_state(kernel, tables, lr0):
+    items = closure_lr0(kernel, tables) if lr0 else closure(kernel, tables)
+    kernels = goto_kernels(items, tables)
+
+    return items, [(sym, kernels[sym]) for sym in sorted(kernels)]
+
+
+# item tables and the kind of items of a worker process, set once when the worker is started
+worker_tables = None
+worker_lr0 = False
+
+
+def init_worker(tables, lr0):
+    global worker_tables, worker_lr0
+    worker_tables = tables
+    worker_lr0 = lr0
+
+
+def expand_state_in_worker(kernel):
+    return expand_state(kernel, worker_tables, worker_lr0)
 
 
 # create a collection of sets of LR(1) items
-def create_collection(nonterminals, terminals):
-    augment_grammar(nonterminals)
+# grammar should already be augmented
+# if lr0 is set, create the collection of sets of LR(0) items instead, all the lookahead bitsets are then empty
+#
+# the collection is built breadth-first, one level of newly discovered states at a time
+# every set of items is identified by its kernel (all of its cores, along with their lookaheads), so an already seen
+# GOTO set is found with one dictionary lookup instead of building its closure again
+# with more than one job, the states of a level are closed and expanded by a pool of worker processes, while the new
+# states are still numbered here, in the order of the level and the symbol ids, so the result does not depend on
+# the number of jobs
+# besides the collection, return the transitions of the automaton, one dictionary for each state, which maps symbol ids
+# to indices of target states
+def create_collection(grammar, lr0=False, jobs=1):
+    tables = ItemTables(grammar)
+
     # starting state is a closure of [__start -> * old_start , $] item
-    # use frozenset because we need immutable sets if we want to hash them
-    start_state = frozenset(closure({Item(nonterminals["__start"], nonterminals["__start"].productions[0], 0,
-                                          terminals['$'])},
-                                    terminals))
-    collection = {start_state}
-    has_new_items = True
-    new_items = set()
-    # loop until there are no new items
-    while has_new_items:
-        has_new_items = False
-        # compute GOTO sets for current items set and all grammar symbols (both terminals and nonterminals)
-        # and add them to the collection
-        for item_set in collection:
-            for sym in nonterminals:
-                goto_set = goto(item_set, nonterminals[sym], terminals)
-                if len(goto_set) > 0:
-                    new_items_size = len(new_items)
-                    new_items.add(frozenset(goto_set))
-                    # check whether the set was actually added
-                    if len(new_items) != new_items_size:
-                        has_new_items = True
-            for sym in terminals:
-                if sym == "eps":
-                    continue
-                goto_set = goto(item_set, terminals[sym], terminals)
-                if len(goto_set) > 0:
-                    new_items_size = len(new_items)
-                    new_items.add(frozenset(goto_set))
-                    # check whether the set was actually added
-                    if len(new_items) != new_items_size:
-                        has_new_items = True
-        collection |= new_items
-
-    #
-    collection = list(collection)
-    collection.remove(start_state)
-    collection.insert(0, start_state)
-
-    return collection
+    kernels = [{grammar.first_core[grammar.start_production]: 0 if lr0 else 1 << grammar.end}]
+    # use frozensets of (core, lookaheads) pairs as keys, because we need immutable kernels if we want to hash them
+    states = {frozenset(kernels[0].items()): 0}
+    collection = []
+    transitions = []
+
+    pool = Pool(jobs, initializer=init_worker, initargs=(tables, lr0)) if jobs > 1 else None
+    try:
+        while len(collection) < len(kernels):
+            level = kernels[len(collection):len(kernels)]
+            if pool is not None:
+                expanded = pool.map(expand_state_in_worker, level, max(1, len(level) // (4 * jobs)))
+            else:
+                expanded = [expand_state(kernel, tables, lr0) for kernel in level]
+
+            for (items, goto_sets) in expanded:
+                transitions.append(dict())
+                for (sym, kernel) in goto_sets:
+                    key = frozenset(kernel.items())
+                    # this is a new state, put it on the next level
+                    if key not in states:
+                        states[key] = len(kernels)
+                        kernels.append(kernel)
+                    transitions[len(collection)][sym] = states[key]
+                collection.append(items)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return collection, transitions
 
 
 # helper function which prints the whole collection
-def print_collection(collection):
+def print_collection(collection, grammar):
     i = 0
     for item_set in collection:
         print("State " + str(i))
-        for item in item_set:
-            print(item)
+        for core in item_set:
+            print(grammar.core_to_string(core, item_set[core]))
         print()
         i += 1
@@ -1,6 +1,3 @@
-from lr1_collection import goto
-
-
 # this implements the computation of ACTION and GOTO tables of an LR(1) parser as described in [1]
 #
 # [1] The Dragon Book, 2nd Ed, p. 265
@@ -32,71 +29,224 @@ def print_goto_table(goto_table):
         state += 1
 
 
+# describe one entry of the ACTION table
+def describe_action(action, grammar):
+    if action == 'a':
+        return "accept"
+    elif action[0] == 's':
+        return "shift to state " + str(action[1])
+    else:
+        return "reduce by " + grammar.production_to_string(action[1])
+
+
 # create ACTION and GOTO tables of the LR(1) parser
-def create_tables(collection, nonterminals, terminals, terminals_list):
+# tables of the SLR(1) and LALR(1) parsers are created in the same way from their (smaller) collections, so the name of
+# the construction method is only used to report the conflicts
+def create_tables(collection, transitions, grammar, method="LR(1)"):
+    num_terminals = grammar.num_terminals
+
     # create empty tables
+    # ACTION table columns are indexed by terminal ids, GOTO table columns by nonterminal ids minus the number of
+    # terminals (the augmented starting symbol does not have a column)
     action_header = []
-    for terminal in terminals_list:
-        action_header.append(terminal)
+    for terminal in grammar.symbols[0:num_terminals]:
+        action_header.append(terminal.name)
 
-    action_table = [[None for y in range(len(terminals_list))] for x in range(len(collection))]
+    action_table = [[None for y in range(len(action_header))] for x in range(len(collection))]
     action_table.insert(0, action_header)
 
     goto_header = []
-    for nonterminal in nonterminals:
-        if nonterminal != "__start":
-            goto_header.append(nonterminal)
+    for nonterminal in grammar.symbols[num_terminals:grammar.start_symbol]:
+        goto_header.append(nonterminal.name)
 
-    goto_table = [[None for y in range(len(nonterminals) - 1)] for x in range(len(collection))]
+    goto_table = [[None for y in range(len(goto_header))] for x in range(len(collection))]
     goto_table.insert(0, goto_header)
 
     # lay out all of the productions into one list
-    productions = []
-    for nonterminal in nonterminals:
-        if nonterminal != "__start":
-            for production in nonterminals[nonterminal].productions:
-                productions.append((nonterminals[nonterminal], production))
+    # production of the augmented starting symbol is the last one, and it is left out
+    productions = grammar.productions[0:grammar.start_production]
 
-    # iterate through every LR(1) item of every set of the collection
+    conflicts = []
     for i in range(len(collection)):
-        for item in collection[i]:
-            # if dot is not at the end of a production (except for empty productions)
-            if item.dot < len(item.production) and item.production[0].name != "eps":
-                # the incoming symbol is the one in front of the dot
-                sym = item.production[item.dot]
-                # compute the GOTO state from this state on the incoming symbol
-                goto_state = goto(collection[i], sym, terminals)
-                if len(goto_state) == 0:
-                    continue
-                goto_state_index = collection.index(goto_state)
-                # if the incoming symbol is a terminal, we populate ACTION table
-                if sym.is_terminal:
-                    sym_index = action_table[0].index(sym.name)
-                    # check whether there is a conflict on the ACTION table entry
-                    if action_table[i + 1][sym_index] is None:
-                        action_table[i + 1][sym_index] = ('s', goto_state_index)
-                    elif action_table[i + 1][sym_index] != ('s', goto_state_index):
-                        raise ConflictError("Grammar conflict! Aborting table generation!")
-                # if the incoming symbol is a nonterminal, we populate GOTO table
-                else:
-                    sym_index = goto_table[0].index(sym.name)
-                    # check whether there is a conflict on the GOTO table entry
-                    if goto_table[i + 1][sym_index] is None:
-                        goto_table[i + 1][sym_index] = goto_state_index
-                    elif goto_table[i + 1][sym_index] != goto_state_index:
-                        raise ConflictError("Grammar conflict! Aborting table generation!")
-            # if the dot is at the end of a production we add a reduce field
+        # transitions of the automaton give the shift actions and GOTO fields
+        for sym in transitions[i]:
+            if grammar.is_terminal(sym):
+                action_table[i + 1][sym] = ('s', transitions[i][sym])
             else:
-                sym = item.lookahead
-                sym_index = action_table[0].index(sym.name)
+                goto_table[i + 1][sym - num_terminals] = transitions[i][sym]
+
+        # if the dot is at the end of a production we add a reduce field for every lookahead
+        for core in collection[i]:
+            if grammar.core_symbol[core] is not None:
+                continue
+
+            production = grammar.core_production[core]
+            for sym in grammar.first_sets.terminals_of(collection[i][core]):
                 # if the head of the item production is the start symbol, this is an accepting configuration
-                if item.nonterminal == nonterminals["__start"] and item.dot == 1 and sym == terminals['$']:
-                    action_table[i + 1][sym_index] = 'a'
-                # else check whether we should reduce or if we have a conflict on the ACTION table entry
-                elif item.nonterminal != nonterminals["__start"] and action_table[i + 1][sym_index] is None:
-                    action_table[i + 1][sym_index] = ('r', productions.index((item.nonterminal, item.production)))
-                elif item.nonterminal != nonterminals["__start"] and \
-                        action_table[i + 1][sym_index] != ('r', productions.index((item.nonterminal, item.production))):
-                    raise ConflictError("Grammar conflict! Aborting table generation!")
+                if production == grammar.start_production and sym == grammar.end:
+                    action = 'a'
+                else:
+                    action = ('r', production)
+
+                # check whether we should reduce or if we have a conflict on the ACTION table entry
+                if action_table[i + 1][sym] is None:
+                    action_table[i + 1][sym] = action
+                elif action_table[i + 1][sym] != action:
+                    kind = "Shift/reduce" if action_table[i + 1][sym][0] == 's' else "Reduce/reduce"
+                    conflicts.append(kind + " conflict in state " + str(i) + " on " + grammar.name(sym) + ": "
+                                     + describe_action(action_table[i + 1][sym], grammar) + " or "
+                                     + describe_action(action, grammar))
+
+    # report all the conflicts at once
+    if len(conflicts) > 0:
+        raise ConflictError("Grammar is not " + method + "! Aborting table generation!\n" + '\n'.join(conflicts))
 
     return action_table, goto_table, productions
+
+
+# find the default reduction of every state, that is, the reduction which fills the most ACTION table entries of its
+# row (on a tie, the one by the production with the lowest number)
+# a state whose row holds nothing but its default reduction and error entries is consistent, it can reduce without
+# looking at the next input symbol, since reducing on an erroneous one only postpones the error until the next shift
+# returns a list of (production of the default reduction or None, whether the state is consistent) pairs
+def create_default_reductions(action_table):
+    default_reductions = []
+    for row in action_table[1:len(action_table)]:
+        counts = dict()
+        for action in row:
+            if action is not None and action != 'a' and action[0] == 'r':
+                counts[action[1]] = counts.get(action[1], 0) + 1
+
+        if len(counts) == 0:
+            default_reductions.append((None, False))
+            continue
+
+        production = min(counts, key=lambda x: (-counts[x], x))
+        consistent = all(action is None or action == ('r', production) for action in row)
+        default_reductions.append((production, consistent))
+
+    return default_reductions
+
+
+# whether reducing by the production only passes the value of its single nonterminal body symbol on to its head
+# that is the case if there is no user defined code (the value is copied as is), or if the code is just '$$ = $0;'
+# and both symbols have the same type
+def is_trivial_unit_production(production):
+    (head, body) = production
+    if len(body) != 1 or body[0].is_terminal:
+        return False
+
+    for i in range(len(head.productions)):
+        if head.productions[i] is body:
+            code = head.code[i].replace(' ', '')
+            return code == '' or (code in ["$$=$0;", "$$=$0"] and head.type == body[0].type)
+
+    return False
+
+
+# rewrite the tables so that the parser never reduces by trivial unit productions (like 'e ::= t')
+#
+# a unit reduction in state t pops only t itself, so the state s below it is always the one from which t was reached
+# by GOTO on the body symbol, and the parser continues in the state GOTO(s, A), where A is the head of the production
+# therefore GOTO(s, B) = t can be replaced by a state which acts like t, except that on the lookaheads for which t
+# reduces by a unit production it acts like GOTO(s, A) right away
+# the value on top of the symbol stack stays the same, since the unit production would only pass it on
+# if t and GOTO(s, A) disagree on some GOTO field, the reduction is kept
+# states which are no longer reachable are dropped at the end, and the remaining ones are renumbered
+#
+# the replacing state depends on s as well as on t, so the rewrite can add many states: with a nonterminal for every
+# level of precedence, a factor reduced in the context of every level needs a state of its own, and the number of
+# states grows with the square of the number of levels
+# therefore no new states are made once there are max_growth times more states than there were (new states which are
+# not reachable in the end count too), and the remaining unit reductions are kept
+# besides the tables, return whether that limit kept any unit reductions
+def eliminate_unit_productions(action_table, goto_table, grammar, max_growth=0.5):
+    num_terminals = grammar.num_terminals
+    unit_heads = dict()
+    for production in range(grammar.start_production):
+        if is_trivial_unit_production(grammar.productions[production]):
+            unit_heads[production] = grammar.heads[production] - num_terminals
+    if len(unit_heads) == 0:
+        return action_table, goto_table, False
+
+    actions = [list(row) for row in action_table[1:len(action_table)]]
+    gotos = [list(row) for row in goto_table[1:len(goto_table)]]
+    max_states = int(len(actions) * (1 + max_growth))
+    # find already existing states by the contents of their rows, so the same merged state is never created twice
+    states = dict()
+    for i in range(len(actions)):
+        states.setdefault((tuple(actions[i]), tuple(gotos[i])), i)
+    limit_reached = False
+
+    # build the state which replaces GOTO(s, B) = t, or return None if there is nothing to replace
+    def skip_unit_reductions(s, t):
+        nonlocal limit_reached
+        new_actions = list(actions[t])
+        new_gotos = list(gotos[t])
+        skipped = set()
+        for sym in range(len(new_actions)):
+            action = new_actions[sym]
+            if action is not None and action != 'a' and action[0] == 'r' and action[1] in unit_heads:
+                u = gotos[s][unit_heads[action[1]]]
+                new_actions[sym] = actions[u][sym]
+                skipped.add(u)
+        if len(skipped) == 0:
+            return None
+
+        for u in skipped:
+            for sym in range(len(new_gotos)):
+                if new_gotos[sym] is None:
+                    new_gotos[sym] = gotos[u][sym]
+                elif gotos[u][sym] is not None and gotos[u][sym] != new_gotos[sym]:
+                    return None
+
+        key = (tuple(new_actions), tuple(new_gotos))
+        if key not in states:
+            if len(actions) >= max_states:
+                limit_reached = True
+                return None
+            states[key] = len(actions)
+            actions.append(new_actions)
+            gotos.append(new_gotos)
+
+        return states[key] if states[key] != t else None
+
+    # keep replacing until there is nothing left to replace, a replacement can expose another unit reduction
+    # (e.g. 'e ::= t' after 't ::= f' was skipped)
+    has_changed = True
+    while has_changed:
+        has_changed = False
+        for s in range(len(gotos)):
+            for sym in range(len(gotos[s])):
+                if gotos[s][sym] is None:
+                    continue
+                new_state = skip_unit_reductions(s, gotos[s][sym])
+                if new_state is not None:
+                    gotos[s][sym] = new_state
+                    has_changed = True
+
+    # number the reachable states in the order in which they are reached from the starting state
+    order = [0]
+    new_index = {0: 0}
+    i = 0
+    while i < len(order):
+        targets = [action[1] for action in actions[order[i]] if action is not None and action != 'a' and action[0] == 's']
+        targets += [target for target in gotos[order[i]] if target is not None]
+        for target in targets:
+            if target not in new_index:
+                new_index[target] = len(order)
+                order.append(target)
+        i += 1
+
+    new_action_table = [action_table[0]]
+    new_goto_table = [goto_table[0]]
+    for state in order:
+        row = []
+        for action in actions[state]:
+            if action is not None and action != 'a' and action[0] == 's':
+                action = ('s', new_index[action[1]])
+            row.append(action)
+        new_action_table.append(row)
+        new_goto_table.append([None if target is None else new_index[target] for target in gotos[state]])
+
+    return new_action_table, new_goto_table, limit_reached
@@ -0,0 +1,114 @@
+from collections import deque
+from lr1_collection import ItemTables, closure, goto_kernels
+
+
+# this creates a minimal LR(1) automaton with Pager's practical general method [1]
+# states are built from LR(1) items, just as in lr1_collection.create_collection, but a new GOTO set is merged into an
+# existing state with the same cores whenever the two are weakly compatible, that is, whenever merging them provably
+# does not introduce a conflict which the canonical LR(1) automaton would not have
+# states are split only where the lookaheads would really clash, so the automaton recognizes everything that the
+# canonical LR(1) automaton does, while having about as many states as the LALR(1) one
+# the returned collection has the same form as the one created by lr1_collection.create_collection
+#
+# [1] Pager, D. (1977). A Practical General Method for Constructing LR(k) Parsers. Acta Informatica, 7(3), 249-268.
+
+
+# whether two kernels with the same cores are weakly compatible
+# for every two cores i and j, the lookaheads that would get mixed by the merge, (L1[i] & L2[j]) | (L1[j] & L2[i]),
+# must be empty, unless one of the kernels already has a common lookahead for i and j on its own
+def weakly_compatible(kernel, other_kernel):
+    cores = list(kernel)
+    for i in range(len(cores)):
+        for j in range(i + 1, len(cores)):
+            (first_i, first_j) = (kernel[cores[i]], kernel[cores[j]])
+            (second_i, second_j) = (other_kernel[cores[i]], other_kernel[cores[j]])
+            if (first_i & second_j) | (first_j & second_i) and not first_i & first_j and not second_i & second_j:
+                return False
+
+    return True
+
+
+# create a minimal collection of sets of LR(1) items
+# grammar should already be augmented
+def create_minimal_collection(grammar):
+    tables = ItemTables(grammar)
+
+    # starting state is a closure of [__start -> * old_start , $] item
+    kernels = [{grammar.first_core[grammar.start_production]: 1 << grammar.end}]
+    collection = [None]
+    transitions = [dict()]
+    # states which share the same set of cores, there can be more of them if they were not compatible
+    states = {frozenset(kernels[0]): [0]}
+
+    # states are (re)processed until none of the kernels grows
+    # whenever lookaheads are merged into an already processed state, its closure and successors are computed again
+    worklist = deque([0])
+    queued = {0}
+    while worklist:
+        i = worklist.popleft()
+        queued.remove(i)
+        collection[i] = closure(kernels[i], tables)
+        transitions[i] = dict()
+
+        goto_sets = goto_kernels(collection[i], tables)
+        # go through the symbols in the order of their ids, so the states are always numbered in the same way
+        for sym in sorted(goto_sets):
+            kernel = goto_sets[sym]
+            cores = frozenset(kernel)
+            if cores not in states:
+                states[cores] = []
+
+            # look for a state which already has all of the lookaheads
+            target = None
+            for j in states[cores]:
+                if all(kernel[core] & ~kernels[j][core] == 0 for core in kernel):
+                    target = j
+                    break
+
+            # otherwise look for a state into which the new lookaheads can be merged
+            if target is None:
+                for j in states[cores]:
+                    if weakly_compatible(kernel, kernels[j]):
+                        for core in kernel:
+                            kernels[j][core] |= kernel[core]
+                        target = j
+                        break
+
+                # otherwise this is a new state
+                if target is None:
+                    target = len(kernels)
+                    kernels.append(dict(kernel))
+                    collection.append(None)
+                    transitions.append(dict())
+                    states[cores].append(target)
+
+                # the state is either new or its kernel grew, so it has to be (re)processed
+                if target not in queued:
+                    worklist.append(target)
+                    queued.add(target)
+
+            transitions[i][sym] = target
+
+    return renumber_states(collection, transitions)
+
+
+# drop the states which are no longer reachable (their predecessors moved on to other states while lookaheads were
+# being merged), and number the remaining ones in the order in which they are reached from the starting state
+def renumber_states(collection, transitions):
+    order = [0]
+    new_index = {0: 0}
+    i = 0
+    while i < len(order):
+        for sym in sorted(transitions[order[i]]):
+            target = transitions[order[i]][sym]
+            if target not in new_index:
+                new_index[target] = len(order)
+                order.append(target)
+        i += 1
+
+    new_collection = [collection[state] for state in order]
+    new_transitions = []
+    for state in order:
+        new_transitions.append({sym: new_index[target] for (sym, target) in transitions[state].items()})
+
+    return new_collection, new_transitions
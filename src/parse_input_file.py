@@ -1,8 +1,15 @@
+import argparse
 import sys
-from emit_parser import create_header_and_emit_manifest, create_body
-from lr1_collection import create_collection
-from lr1_tables import create_tables
-from process_production import process_production, Terminal
+from emit_parser import create_header_and_emit_manifest, create_body, tables_fingerprint
+from emit_python import create_python_module
+from grammar import Grammar
+from lr0_collection import create_lalr_collection, create_slr_collection
+from lr1_collection import augment_grammar, create_collection
+from lr1_tables import ConflictError, create_default_reductions, create_tables, eliminate_unit_productions
+from minimal_collection import create_minimal_collection
+from process_production import process_production, remove_useless_symbols, ParseError, Terminal
+from table_formats import CompressedTables, DenseTables
+from table_profile import load_profiles, renumber_by_profile, ProfileError
 
 
 # error reporting helper routine
@@ -165,19 +172,150 @@ def collect_productions(file, line_num, types, terminals, nonterminals, terminal
             report_error("Ill-formed production!", line_num)
 
 
-def do_the_magic(manifest_code, types, terminals, nonterminals, terminals_list):
-    collection = create_collection(nonterminals, terminals)
-
-    (action_table, goto_table, productions) = create_tables(collection, nonterminals, terminals, terminals_list)
-    create_header_and_emit_manifest(manifest_code, types, collection, goto_table, action_table, productions)
-    create_body(action_table, goto_table, productions)
-
-
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        report_error("Incorrect number of command line arguments! Should be only the input file name!", 0)
-
-    filename = sys.argv[1]
+# parse the command line arguments
+def parse_arguments(args=None):
+    arg_parser = argparse.ArgumentParser(description="Generate an LR parser in C++ from an .mlg grammar specification.")
+    arg_parser.add_argument("input_file", help="grammar specification, with an .mlg extension")
+    arg_parser.add_argument("--mode", choices=["lr1", "minimal-lr1", "lalr1", "slr1"], default="lr1",
+                            help="parsing table construction method: canonical LR(1) (default), minimal LR(1), "
+                                 "LALR(1) or SLR(1)")
+    arg_parser.add_argument("--jobs", type=int, default=1, metavar='N',
+                            help="number of worker processes which build the collection of item sets "
+                                 "(not used by the minimal LR(1) mode, whose states depend on the order of merging)")
+    arg_parser.add_argument("--eliminate-unit-productions", action="store_true",
+                            help="rewrite the tables so that the parser skips reductions by unit productions "
+                                 "(like 'e ::= t') which have no user defined code, or just '$$ = $0;'")
+    arg_parser.add_argument("--max-state-growth", type=int, default=50, metavar="PERCENT",
+                            help="how many states --eliminate-unit-productions may add, in percent of the states the "
+                                 "automaton had (default 50), since it can add a number of states which grows with the "
+                                 "square of the number of precedence levels; the unit reductions which would need more "
+                                 "states are kept")
+    arg_parser.add_argument("--tables", choices=["dense", "compressed"], default="dense",
+                            help="layout of the ACTION and GOTO tables in the generated parser: dense two dimensional "
+                                 "arrays (default), or compressed row displacement tables with check arrays and "
+                                 "default actions")
+    arg_parser.add_argument("--backend", choices=["tables", "direct", "python"], default="tables",
+                            help="kind of the generated parser: a loop driven by the ACTION and GOTO tables (default), "
+                                 "direct code with a block per state, where the transitions are jumps (the table "
+                                 "options do not apply to it), or a python module my_little_parser.py driven by dense "
+                                 "tables, which runs python callables instead of the user defined code (only the "
+                                 "options which shape the tables apply to it)")
+    arg_parser.add_argument("--separate-tables", action="store_true",
+                            help="emit the tables into my_little_parser_tables.cpp, which is only rewritten when they "
+                                 "change, so editing the user defined code does not recompile them")
+    arg_parser.add_argument("--lexemes", choices=["copy", "view"], default="copy",
+                            help="storage of the lexemes of terminals: a heap allocated copy for every token "
+                                 "(default), or a view into an arena which is released when the next parse begins")
+    arg_parser.add_argument("--incremental", action="store_true",
+                            help="keep the tree of the last parse, so that an edited input can be parsed again by "
+                                 "reusing the subtrees which the edit did not touch (needs the tables backend)")
+    arg_parser.add_argument("--parse-many", action="store_true",
+                            help="also emit parse_many(), which parses a list of files on a pool of threads")
+    arg_parser.add_argument("--syntax-tree", action="store_true",
+                            help="build the concrete syntax tree of every parse, as a flat array of nodes")
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="count the shifts, reductions, visits to states and depths of the stacks in the "
+                                 "generated parser, and time the user defined code if MY_LITTLE_PARSER_TIME_ACTIONS is "
+                                 "defined")
+    arg_parser.add_argument("--profile", action="append", default=[], metavar="FILE",
+                            help="counters written by dump_stats() of a parser generated from the same grammar with "
+                                 "the same options and --stats; the states and productions used most often get the "
+                                 "lowest numbers, so their parts of the tables are close together (can be given more "
+                                 "than once, the counters are summed)")
+
+    options = arg_parser.parse_args(args)
+    if options.jobs < 1:
+        arg_parser.error("number of jobs should be at least 1")
+    if options.max_state_growth < 0:
+        arg_parser.error("growth of the number of states can not be negative")
+    if options.incremental and options.backend == "direct":
+        arg_parser.error("incremental parsing needs the tables backend")
+    if options.incremental and options.syntax_tree:
+        arg_parser.error("syntax trees can not be built by incremental parsing")
+    if options.syntax_tree and options.eliminate_unit_productions:
+        arg_parser.error("syntax trees need a node for every reduction, so unit productions can not be skipped")
+    if options.incremental and options.lexemes == "view":
+        arg_parser.error("incremental parsing keeps values of the last parse, which can not hold views of its lexemes")
+    if options.backend == "python" and (options.incremental or options.parse_many or options.syntax_tree
+                                        or options.stats or options.lexemes != "copy" or options.separate_tables):
+        arg_parser.error("the python backend only takes the options which shape the tables")
+
+    return options
+
+
+def do_the_magic(manifest_code, types, terminals, nonterminals, terminals_list, options):
+    # drop the symbols which can never take part in parsing a correct input
+    try:
+        warnings = remove_useless_symbols(nonterminals)
+    except ParseError as error:
+        print(error)
+        exit(1)
+    for warning in warnings:
+        print("Warning: " + warning)
+
+    augment_grammar(nonterminals)
+    grammar = Grammar(terminals, nonterminals, terminals_list)
+
+    # create the automaton with the chosen method
+    if options.mode == "minimal-lr1":
+        (collection, transitions) = create_minimal_collection(grammar)
+        method = "LR(1)"
+    elif options.mode == "lalr1":
+        (collection, transitions) = create_lalr_collection(grammar, options.jobs)
+        method = "LALR(1)"
+    elif options.mode == "slr1":
+        (collection, transitions) = create_slr_collection(grammar, options.jobs)
+        method = "SLR(1)"
+    else:
+        (collection, transitions) = create_collection(grammar, jobs=options.jobs)
+        method = "LR(1)"
+
+    try:
+        (action_table, goto_table, productions) = create_tables(collection, transitions, grammar, method)
+    except ConflictError as error:
+        print(error)
+        exit(1)
+
+    if options.eliminate_unit_productions:
+        num_states = len(action_table) - 1
+        (action_table, goto_table, limit_reached) = eliminate_unit_productions(action_table, goto_table, grammar,
+                                                                               options.max_state_growth / 100)
+        if limit_reached:
+            print("Warning: some unit productions are still reduced, since skipping all of them would grow the "
+                  "automaton by more than " + str(options.max_state_growth) + "% (it went from " + str(num_states)
+                  + " to " + str(len(action_table) - 1) + " states), see --max-state-growth", file=sys.stderr)
+    if len(options.profile) > 0:
+        try:
+            (state_visits, reductions) = load_profiles(options.profile,
+                                                       tables_fingerprint(action_table, goto_table, productions))
+            (action_table, goto_table, productions) = renumber_by_profile(action_table, goto_table, productions,
+                                                                          state_visits, reductions)
+        except ProfileError as error:
+            print(error)
+            exit(1)
+    default_reductions = create_default_reductions(action_table)
+
+    if options.backend == "python":
+        create_python_module(action_table, goto_table, productions,
+                             DenseTables(action_table, goto_table, default_reductions, len(productions)))
+        return
+
+    if options.backend == "direct":
+        tables = None
+    elif options.tables == "compressed":
+        tables = CompressedTables(action_table, goto_table, default_reductions, len(productions))
+    else:
+        tables = DenseTables(action_table, goto_table, default_reductions, len(productions))
+
+    lexeme_views = options.lexemes == "view"
+    create_header_and_emit_manifest(manifest_code, types, goto_table, action_table, productions, tables, lexeme_views,
+                                    options.incremental, options.parse_many, options.syntax_tree, options.stats)
+    create_body(action_table, goto_table, productions, default_reductions, tables, options.separate_tables,
+                lexeme_views, options.incremental, options.parse_many, options.syntax_tree, options.stats)
+
+
+# read all the sections of the input file
+def read_input_file(filename):
     if ".mlg" not in filename:
         report_error("Input file name should have .mll extension!", 0)
 
@@ -199,5 +337,13 @@ if __name__ == "__main__":
         # process the grammar productions
         collect_productions(file, line_num, types, terminals, nonterminals, terminals_list)
 
-        # create ACTION and GOTO table and emit parser code
-        do_the_magic(manifest_code, types, terminals, nonterminals, terminals_list)
\ No newline at end of file
+    return manifest_code, types, terminals, nonterminals, terminals_list
+
+
+if __name__ == "__main__":
+    options = parse_arguments()
+
+    (manifest_code, types, terminals, nonterminals, terminals_list) = read_input_file(options.input_file)
+
+    # create ACTION and GOTO table and emit parser code
+    do_the_magic(manifest_code, types, terminals, nonterminals, terminals_list, options)
\ No newline at end of file
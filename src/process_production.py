@@ -8,6 +8,8 @@ class GrammarSymbol:
     def __init__(self, is_terminal, name):
         self.is_terminal = is_terminal
         self.name = name
+        # dense integer id of the symbol, assigned once the whole grammar is known
+        self.id = None
 
     def __str__(self):
         return self.name
@@ -84,3 +86,66 @@ def process_production(head, body, type, code, terminals, nonterminals, terminal
             raise ParseError("Unexpected symbol " + sym + " in the production stream!")
     nonterminals[head].productions.append(production)
     nonterminals[head].code.append(code)
+
+
+# find the nonterminals which can not derive any string of terminals (unproductive), and the ones which can not be
+# reached from the starting symbol (unreachable), and remove them along with all the productions which use them
+# such symbols are never needed to parse a correct input, but they would still take place in states and tables
+# unproductive symbols are removed first, since removing their productions can make other symbols unreachable
+# return a list of warnings, one for each removed nonterminal or production
+def remove_useless_symbols(nonterminals):
+    warnings = []
+
+    # a nonterminal is productive if it has a production whose body contains only terminals and productive nonterminals
+    productive = set()
+    has_changed = True
+    while has_changed:
+        has_changed = False
+        for name in nonterminals:
+            if name in productive:
+                continue
+            for production in nonterminals[name].productions:
+                if all(sym.is_terminal or sym.name in productive for sym in production):
+                    productive.add(name)
+                    has_changed = True
+                    break
+
+    for name in nonterminals:
+        nonterminal = nonterminals[name]
+        if name not in productive:
+            if nonterminal.is_start:
+                raise ParseError("Starting symbol " + name + " can not derive any string of terminals!")
+            warnings.append("Nonterminal " + name + " can not derive any string of terminals, removing it.")
+            continue
+
+        # remove the productions which use unproductive nonterminals
+        i = 0
+        while i < len(nonterminal.productions):
+            production = nonterminal.productions[i]
+            if all(sym.is_terminal or sym.name in productive for sym in production):
+                i += 1
+                continue
+            warnings.append("Production " + name + " -> " + ' '.join(str(sym) for sym in production)
+                            + " uses unproductive symbols, removing it.")
+            del nonterminal.productions[i]
+            del nonterminal.code[i]
+
+    # a nonterminal is reachable if it appears in a production of the starting symbol or of a reachable nonterminal
+    start = [name for name in nonterminals if nonterminals[name].is_start][0]
+    reachable = {start}
+    unprocessed = [start]
+    while unprocessed:
+        for production in nonterminals[unprocessed.pop()].productions:
+            for sym in production:
+                if not sym.is_terminal and sym.name not in reachable:
+                    reachable.add(sym.name)
+                    unprocessed.append(sym.name)
+
+    for name in list(nonterminals):
+        if name not in productive:
+            del nonterminals[name]
+        elif name not in reachable:
+            warnings.append("Nonterminal " + name + " is not reachable from the starting symbol, removing it.")
+            del nonterminals[name]
+
+    return warnings
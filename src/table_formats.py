@@ -0,0 +1,185 @@
+# this lays out ACTION and GOTO tables as arrays of plain integers, which the generated parser can use without any
+# construction at startup
+#
+# actions are encoded as integers: n > 0 shifts to state n, -p - 1 reduces by production p, and 0 is an error
+# accepting is encoded as a reduction by the production of the augmented starting symbol, which is numbered last
+# default actions are encoded as p + 1 for a reduction by production p, and 0 for an error
+#
+# dense tables keep a field for every state and symbol, with empty GOTO fields set to the number of states
+# only the consistent states get a default action, since the others need the lookahead to decide anyway
+#
+# compressed tables pack the ACTION and GOTO tables into comb vectors, much like Bison does
+# every state gets a default action (its dominant reduction, or an error), and every nonterminal gets a default GOTO
+# state (the most common one in its column)
+# the remaining entries of each ACTION row and each GOTO column form a sparse vector, and all of the vectors are laid
+# over one shared table (comb vectors), each one at its own base offset, so that no two of them use the same slot
+# next to the table there is a check array, which tells which vector a slot belongs to
+#   action(s, t) = table[action_base[s] + t], if check[action_base[s] + t] == t, otherwise the default action of s
+#   goto(s, A) = table[goto_base[A] + s], if check[goto_base[A] + s] == s, otherwise the default GOTO state of A
+# no two vectors share a base, so a lookup can never find an entry of another vector with a matching check
+# this is the base/next/check representation of sparse transition tables, described in [1]
+#
+# [1] The Dragon Book, 2nd Ed, section 3.9.8
+
+
+# smallest fixed width c++ integer type which can hold all the values between low and high
+def integer_type(low, high):
+    if low >= 0:
+        for bits in [8, 16, 32]:
+            if high < 1 << bits:
+                return "uint" + str(bits) + "_t"
+    else:
+        for bits in [8, 16, 32]:
+            if low >= -(1 << (bits - 1)) and high < 1 << (bits - 1):
+                return "int" + str(bits) + "_t"
+
+    return "int64_t"
+
+
+# encode an entry of the ACTION table as an integer
+def encode_action(action, num_productions):
+    if action is None:
+        return 0
+    elif action == 'a':
+        return -num_productions - 1
+    elif action[0] == 's':
+        return action[1]
+    else:
+        return -action[1] - 1
+
+
+# dense ACTION and GOTO tables, along with the types that fit them
+class DenseTables:
+    def __init__(self, action_table, goto_table, default_reductions, num_productions):
+        num_states = len(action_table) - 1
+        self.num_productions = num_productions
+        self.accept = -num_productions - 1
+
+        self.actions = [[encode_action(action, num_productions) for action in row]
+                        for row in action_table[1:len(action_table)]]
+        self.gotos = [[num_states if target is None else target for target in row]
+                      for row in goto_table[1:len(goto_table)]]
+        self.default_actions = [production + 1 if consistent else 0
+                                for (production, consistent) in default_reductions]
+
+        # pick the integer types
+        self.state_type = integer_type(0, num_states)
+        self.action_type = integer_type(self.accept, num_states - 1)
+        self.default_action_type = integer_type(0, num_productions)
+
+
+# compressed ACTION and GOTO tables, along with the types that fit them
+class CompressedTables:
+    def __init__(self, action_table, goto_table, default_reductions, num_productions):
+        num_states = len(action_table) - 1
+        num_terminals = len(action_table[0])
+        num_nonterminals = len(goto_table[0])
+        # the production of the augmented starting symbol follows the ones of the grammar
+        self.num_productions = num_productions
+        self.accept = -num_productions - 1
+
+        # default actions and the sparse ACTION rows
+        self.default_actions = []
+        action_vectors = []
+        for i in range(num_states):
+            (production, consistent) = default_reductions[i]
+            self.default_actions.append(0 if production is None else production + 1)
+
+            vector = dict()
+            for sym in range(num_terminals):
+                action = action_table[i + 1][sym]
+                if action is not None and action != ('r', production):
+                    vector[sym] = encode_action(action, num_productions)
+            action_vectors.append(vector)
+
+        # default GOTO states and the sparse GOTO columns
+        # the GOTO table is never consulted on empty fields, so they can be filled with anything
+        self.default_gotos = []
+        goto_vectors = []
+        for sym in range(num_nonterminals):
+            counts = dict()
+            for i in range(num_states):
+                target = goto_table[i + 1][sym]
+                if target is not None:
+                    counts[target] = counts.get(target, 0) + 1
+            default = min(counts, key=lambda x: (-counts[x], x)) if len(counts) > 0 else 0
+            self.default_gotos.append(default)
+
+            vector = dict()
+            for i in range(num_states):
+                target = goto_table[i + 1][sym]
+                if target is not None and target != default:
+                    vector[i] = target
+            goto_vectors.append(vector)
+
+        # lay the vectors over the shared table
+        # a row without any entries gets a base for which every lookup falls outside of the table,
+        # which also marks the consistent states, the ones that reduce without looking at the next input symbol
+        self.no_action_base = -num_terminals
+        self.no_goto_base = -num_states
+        (bases, self.table, self.check) = pack_vectors([('a', vector) for vector in action_vectors]
+                                                       + [('g', vector) for vector in goto_vectors],
+                                                       max(num_terminals, num_states))
+        self.action_base = [self.no_action_base if base is None else base for base in bases[0:num_states]]
+        self.goto_base = [self.no_goto_base if base is None else base for base in bases[num_states:len(bases)]]
+        # c++ does not allow empty arrays
+        if len(self.table) == 0:
+            self.table.append(0)
+            self.check.append(max(num_terminals, num_states))
+
+        # pick the integer types
+        self.state_type = integer_type(0, num_states)
+        self.action_type = integer_type(min(self.table + [self.accept]), max(self.table + [0]))
+        self.check_type = integer_type(0, max(self.check + [0]))
+        self.action_base_type = integer_type(min(self.action_base), max(self.action_base + [0]))
+        self.goto_base_type = integer_type(min(self.goto_base), max(self.goto_base + [0]))
+        self.default_action_type = integer_type(0, self.num_productions)
+        self.default_goto_type = integer_type(0, max(self.default_gotos + [0]))
+
+
+# place each sparse vector (a dictionary of column: value) of the given (kind, vector) pairs on a shared table
+# vectors are placed with first fit, the ones with the most entries first
+# vectors of the same kind with the same entries share their base, otherwise all the bases are different
+# free slots of the table hold zeros, and their check is set to no_check, which never matches any column
+# returns the base of each vector (None for an empty vector), the table and the check array
+def pack_vectors(vectors, no_check):
+    bases = [None for vector in vectors]
+    table = []
+    check = []
+    used_bases = set()
+    placed = dict()
+    # every slot before this one is taken
+    first_free = 0
+
+    order = sorted(range(len(vectors)), key=lambda x: -len(vectors[x][1]))
+    for i in order:
+        (kind, vector) = vectors[i]
+        if len(vector) == 0:
+            continue
+
+        key = (kind, tuple(sorted(vector.items())))
+        if key in placed:
+            bases[i] = placed[key]
+            continue
+
+        columns = sorted(vector)
+        base = first_free - columns[0]
+        while base in used_bases or \
+                any(base + column < len(check) and check[base + column] != no_check for column in columns):
+            base += 1
+
+        size = base + columns[-1] + 1
+        if size > len(table):
+            table += [0 for x in range(size - len(table))]
+            check += [no_check for x in range(size - len(check))]
+        for column in columns:
+            table[base + column] = vector[column]
+            check[base + column] = column
+
+        bases[i] = base
+        used_bases.add(base)
+        placed[key] = base
+        while first_free < len(check) and check[first_free] != no_check:
+            first_free += 1
+
+    return bases, table, check
@@ -0,0 +1,84 @@
+# renumber the states and productions of the parser by how often they are used, as recorded from representative inputs
+#
+# the profile is the JSON object written by dump_stats() of a parser generated with the --stats option, from the same
+# grammar and with the same table construction options, but without a profile
+# it holds the fingerprint of the tables of that parser, so a profile of other tables is rejected, even if they happen to
+# have as many states
+# states which are visited often get the low numbers, so their rows of the tables end up next to each other, and the
+# same goes for the productions (their heads and lengths, and the code which reduces by them)
+# the terminals keep their numbers, since they are the token types of the lexer
+import json
+from emit_parser import production_to_string
+
+
+# throw this if the profile can not be read, or does not fit the tables
+class ProfileError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+# read the profiles and sum their counters
+# fingerprint is the one of the tables to be renumbered (see emit_parser.tables_fingerprint()), and every profile has to
+# be recorded by a parser with those tables
+# returns a list of visits of every state, and a dictionary of reductions by every production, keyed by its text
+def load_profiles(filenames, fingerprint):
+    state_visits = None
+    reductions = dict()
+    for filename in filenames:
+        try:
+            with open(filename, 'r') as file:
+                profile = json.load(file)
+            tables = profile.get("tables")
+            visits = [int(count) for count in profile["state_visits"]]
+            counts = [(entry["production"], int(entry["reductions"])) for entry in profile["productions"]]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as error:
+            raise ProfileError("Can not read the profile " + filename + ": " + str(error))
+
+        if tables != fingerprint:
+            raise ProfileError("Profile " + filename + " was recorded by a parser with different tables! Was it "
+                               "generated from the same grammar with the same options, and without a profile?")
+
+        if state_visits is None:
+            state_visits = visits
+        elif len(visits) != len(state_visits):
+            raise ProfileError("Profile " + filename + " was recorded by a parser with a different number of states!")
+        else:
+            state_visits = [state_visits[i] + visits[i] for i in range(len(visits))]
+        for (production, count) in counts:
+            reductions[production] = reductions.get(production, 0) + count
+
+    return state_visits, reductions
+
+
+# renumber the states and productions so that the ones used most often come first (ties keep their old order)
+# the starting state stays the state 0
+def renumber_by_profile(action_table, goto_table, productions, state_visits, reductions):
+    num_states = len(action_table) - 1
+    if len(state_visits) != num_states:
+        raise ProfileError("Profile was recorded by a parser with " + str(len(state_visits)) + " states, but this one "
+                           "has " + str(num_states) + "! Was it generated with the same options?")
+    names = [production_to_string(production) for production in productions]
+    unknown = [name for name in reductions if name not in names]
+    if len(unknown) > 0:
+        raise ProfileError("Profile has productions which are not in the grammar: " + ', '.join(unknown))
+
+    state_order = [0] + sorted(range(1, num_states), key=lambda x: (-state_visits[x], x))
+    production_order = sorted(range(len(productions)), key=lambda x: (-reductions.get(names[x], 0), x))
+    new_state = {state_order[i]: i for i in range(num_states)}
+    new_production = {production_order[i]: i for i in range(len(productions))}
+
+    new_action_table = [action_table[0]]
+    new_goto_table = [goto_table[0]]
+    for state in state_order:
+        row = []
+        for action in action_table[state + 1]:
+            if action is not None and action != 'a':
+                action = (action[0], new_state[action[1]] if action[0] == 's' else new_production[action[1]])
+            row.append(action)
+        new_action_table.append(row)
+        new_goto_table.append([None if target is None else new_state[target] for target in goto_table[state + 1]])
+
+    return new_action_table, new_goto_table, [productions[production] for production in production_order]